@@ -10,9 +10,6 @@ values
 6) status
 and produces the author list output formatted for AASTeX publications."""
 
-import re
-import sys
-
 from .ta_auth import ta_auth
 
 __author__    = 'William Hanlon'
@@ -26,46 +23,31 @@ __status__    = 'Production'
 
 class aastex(ta_auth):
     def dumpPreamble(self):
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'w')
-
-        print("""\\documentclass{aastex62}
+        self.emit("""\\documentclass{aastex62}
 \\begin{document}
 \\title{Telescope Array Collaboration}
 \\date{}
 """)
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
 
     def dumpAuthor(self):
         """Prints the author list for use with the aastex62 package."""
 
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'a')
-
-        for _, surname, initials, orcid, _, institution, status in \
-                self.author_data:
+        for a in self.author_data:
+            surname, initials, orcid, status = (a.surname, a.initials,
+                    a.orcid, a.status)
             line = '\\author'
             if orcid != '':
                 line += '[' + orcid + ']'
             line += '{' + initials + ' ' + surname + '}'
-            print(line)
+            self.emit(line)
 
             if status != '':
                 line = '\\altaffiliation{' + status + '}'
-                print(line)
+                self.emit(line)
 
             # institutions this author belongs to
-            for m in re.split('\} *\{', institution):
-                inst = m.strip('{}')
+            for inst in a.institution_list:
                 line = '\\affiliation{' + inst + '}'
-                print(line)
-
-            print('')
+                self.emit(line)
 
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
+            self.emit('')
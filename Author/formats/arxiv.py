@@ -1,9 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from operator import itemgetter
-import sys
-
 from .ta_auth import ta_auth
 
 __author__    = 'William Hanlon'
@@ -22,18 +19,15 @@ class arxiv(ta_auth):
         """Prints the TA author list in simple format for use on arXiv.org
         author lists."""
 
-        self.sort_and_number_institutions()
-
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'w')
+        # institutions are numbered once, by the author_model read in
+        # readAuthor
 
         authnum = 1
         line = 'Telescope Array Collaboration: '
-        for _, surname, initials, _, _, institution, _ in self.author_data:
-            line += initials + ' ' + surname + ' ('
+        for a in self.author_data:
+            line += a.initials + ' ' + a.surname + ' ('
 
-            inst_num = self.get_author_institution_numbers(institution)
+            inst_num = a.institution_numbers
 
             i = 0
             # institution numbers are sorted
@@ -51,19 +45,14 @@ class arxiv(ta_auth):
         # now add the list of institutions
         inst_count = 1
         line += ' ('
-        for key, value in sorted(self.institution_ordinal.items(), key =
-                itemgetter(1)):
+        for value, key in enumerate(self.institutions, 1):
             line = line + '(' + str(value) + ') ' + key 
-            if inst_count != len(self.institution_ordinal):
+            if inst_count != len(self.institutions):
                 line += ', '
             inst_count += 1
         line += ')'
 
-        print(line)
-
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
+        self.emit(line)
 
     def dump(self):
         self.dumpAuthor()
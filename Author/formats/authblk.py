@@ -10,10 +10,6 @@ values
 6) status
 and produces the author list output formatted for plain LaTeX."""
 
-from operator import itemgetter
-import re
-import sys
-
 from .ta_auth import ta_auth
 
 __author__    = 'William Hanlon'
@@ -30,11 +26,7 @@ class authblk(ta_auth):
     """Prints the author list in for use with the authblk package."""
 
     def dumpPreamble(self):
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'w')
-
-        print("""\\documentclass[10pt]{article}
+        self.emit("""\\documentclass[10pt]{article}
 \\usepackage[utf8]{inputenc}
 \\usepackage[affil-it]{authblk}
 \\usepackage[margin=1in]{geometry}
@@ -49,28 +41,20 @@ class authblk(ta_auth):
 
 """)
 
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
-
     def dumpAuthor(self):
-        # generate a unique list of insitutions and their numbering as they
-        # should appear in the author list
-        self.sort_and_number_institutions()
-
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'a')
+        # institutions are numbered once, by the author_model read in
+        # readAuthor
 
         # give a hint as to what package to use and options we are using
         #print '\\usepackage[affil-it]{authblk}'
         #print '\\renewcommand\\Affilfont{\\itshape\\footnotesize}'
 
-        for _, surname, initials, _, _, institution, status in self.author_data:
+        for a in self.author_data:
+            surname, initials, status = a.surname, a.initials, a.status
             line = '\\author['
 
-            # get a sorted list of institution numbers for this author
-            inst_num = self.get_author_institution_numbers(institution)
+            # sorted list of institution numbers for this author
+            inst_num = a.institution_numbers
 
             i = 0
             for j in inst_num:
@@ -82,17 +66,12 @@ class authblk(ta_auth):
             if status != '':
                 line += '\\footnote{' + status + '}'
             line += '}'
-            print(line)
+            self.emit(line)
 
-        for key, value in sorted(self.institution_ordinal.items(), key =
-                itemgetter(1)):
+        for value, key in enumerate(self.institutions, 1):
             line = '\\affil[' + str(value) + ']{' + key + '}'
-            print(line)
-
-        print('\\maketitle')
-        print('')
+            self.emit(line)
 
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
+        self.emit('\\maketitle')
+        self.emit('')
 
@@ -10,10 +10,6 @@ values
 6) status
 and produces the author list output formatted for plain LaTeX."""
 
-from operator import itemgetter
-import re
-import sys
-
 from .ta_auth import ta_auth
 
 __author__    = 'William Hanlon'
@@ -30,11 +26,7 @@ class plain_latex(ta_auth):
     are required to use this format in a LaTeX document."""
 
     def dumpPreamble(self):
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'w')
-
-        print("""\\documentclass[10pt]{article}
+        self.emit("""\\documentclass[10pt]{article}
 \\usepackage[margin=1in]{geometry}
 
 \\title{Telescope Array Collaboration}
@@ -45,20 +37,11 @@ class plain_latex(ta_auth):
 \\maketitle
 """)
 
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
-
     def dumpAuthor(self):
-    # generate a unique list of insitutions and their numbering as they
-    #should appear in the author list
-        self.sort_and_number_institutions()
-
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'a')
+        # institutions are numbered once, by the author_model read in
+        # readAuthor
 
-        print("""\\makeatletter
+        self.emit("""\\makeatletter
 \\newcommand{\\ssymbol}[1]{^{\\@fnsymbol{#1}}}
 \\makeatother
 \\par\\noindent""")
@@ -70,7 +53,8 @@ class plain_latex(ta_auth):
         status_data = []
 
         linenum = 1
-        for _, surname, initials, _, _, institution, status in self.author_data:
+        for a in self.author_data:
+            surname, initials, status = a.surname, a.initials, a.status
             line = ''
             if linenum == len(self.author_data):
                 line = 'and '
@@ -79,8 +63,8 @@ class plain_latex(ta_auth):
             surname = surname.replace(' ', '~')
             line = line + initials + "~" + surname + '$^{'
 
-            # get a sorted list of institution numbers for this author
-            inst_num = self.get_author_institution_numbers(institution)
+            # sorted list of institution numbers for this author
+            inst_num = a.institution_numbers
 
             i = 0
             # institution numbers are sorted
@@ -98,25 +82,20 @@ class plain_latex(ta_auth):
             line += '}$'
             if linenum != len(self.author_data):
                 line += ','
-            print(line)
+            self.emit(line)
             linenum += 1
 
-        print('\\bigskip')
-        print('\\par\\noindent')
-        print('{\\footnotesize\\it')
+        self.emit('\\bigskip')
+        self.emit('\\par\\noindent')
+        self.emit('{\\footnotesize\\it')
 
-        for key, value in sorted(self.institution_ordinal.items(),
-                key = itemgetter(1)):
+        for value, key in enumerate(self.institutions, 1):
             line = '$^{' + str(value) + '}$ ' + key + ' \\\\'
-            print(line)
+            self.emit(line)
 
-        print('')
+        self.emit('')
         for i in range(len(status_data)):
-            print('\\let\\thefootnote\\relax\\footnote{{$\\ssymbol{{{0}}}$ {1}}}'.format(i + 1, status_data[i]))
-        print('\\addtocounter{footnote}{-1}\\let\\thefootnote\\svthefootnote')
-        print('}')
-        print('\\par\\noindent')
-
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
+            self.emit('\\let\\thefootnote\\relax\\footnote{{$\\ssymbol{{{0}}}$ {1}}}'.format(i + 1, status_data[i]))
+        self.emit('\\addtocounter{footnote}{-1}\\let\\thefootnote\\svthefootnote')
+        self.emit('}')
+        self.emit('\\par\\noindent')
@@ -10,9 +10,6 @@ values
 6) status
 and produces the author list output formatted for AASTeX publications."""
 
-import re
-import sys
-
 from .ta_auth import ta_auth
 
 __author__    = 'William Hanlon'
@@ -28,47 +25,31 @@ __status__    = 'Production'
 # this is written for revtex 4.2
 class revtex(ta_auth):
     def dumpPreamble(self):
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'w')
-
-        print("""\\documentclass[superscriptaddress]{revtex4-2}
+        self.emit("""\\documentclass[superscriptaddress]{revtex4-2}
 \\begin{document}
 \\title{Telescope Array Collaboration}
 \\date{}
 """)
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
 
     def dumpAuthor(self):
         """Prints the author list for use with the revtex 4.2 package."""
 
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'a')
-
-        for _, surname, initials, orcid, _, institution, status in \
-                self.author_data:
+        for a in self.author_data:
+            surname, initials, status = a.surname, a.initials, a.status
             line = '\\author'
             line += '{' + initials + ' ' + surname + '}'
-            print(line)
+            self.emit(line)
 
             if status != '':
                 line = '\\altaffiliation{' + status + '}'
-                print(line)
+                self.emit(line)
 
             # institutions this author belongs to
-            for m in re.split('\} *\{', institution):
-                inst = m.strip('{}')
+            for inst in a.institution_list:
                 line = '\\affiliation{' + inst + '}'
-                print(line)
-
-            print('')
+                self.emit(line)
 
-        print('\\collaboration{The Telescope Array Collaboration}')
-        print('\\noaffiliation')
+            self.emit('')
 
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
+        self.emit('\\collaboration{The Telescope Array Collaboration}')
+        self.emit('\\noaffiliation')
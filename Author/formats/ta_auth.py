@@ -11,111 +11,82 @@ __email__     = 'whanlon@cosmic.utah.edu'
 __status__    = 'Production'
 
 from collections import Counter
+from collections import namedtuple
 import operator
 import csv
+import io
+import json
+import os
 import re
 import sys
 
-class ta_auth:
-    """Base class for TA author data formatting classes."""
-    def __init__(self, authInFileName, ackInFileName,
-            outFileName = None):
-        # list of tuples, where tuple content is
-        #(sort key,
-        # surname,
-        # intials,
-        # orcid,
-        # institution codes
-        # institutions,
-        # status)
+# an author read from the CSV file. the first seven fields are the columns
+# used (with the sort key first, so that records sort by author name). the
+# others are parsed from them once, when the file is read:
+#   institution_list    names of the institutions, in the order given
+#   code_list           institution codes, in the order given
+#   countries           country of each institution (the last part of its
+#                       name)
+#   institution_numbers sorted ordinal numbers of the institutions (see
+#                       author_model.institution_ordinal)
+author_record = namedtuple('author_record', ['sort_key', 'surname',
+    'initials', 'orcid', 'institution_code', 'institutions', 'status',
+    'institution_list', 'code_list', 'countries', 'institution_numbers'])
+
+# separates the institutions of an author, each enclosed in {}
+institution_separator = re.compile(r'\} *\{')
+
+def split_institutions(institutions):
+    """Returns the tuple of institution names in the string institutions,
+    where each is enclosed in {}."""
+    return tuple(m.strip('{}') for m in
+            institution_separator.split(institutions))
+
+def compile_author(row):
+    """Returns the author_record of a row of the CSV file. Its institution
+    numbers are left empty until the institutions are numbered."""
+    surname      = row[0].strip()
+    initials     = row[2].strip()
+    orcid        = row[3].strip()
+    institution_code = row[4].strip()
+    institutions = row[5].strip()
+    status       = row[6].strip()
+    # the author order is sorted according to 'last name, initials'
+    sort_key     = surname.upper() + ',' + initials.upper()
+
+    institution_list = split_institutions(institutions)
+    code_list = tuple(m.strip() for m in institution_code.split(','))
+    countries = tuple(inst.split(',')[-1].strip()
+            for inst in institution_list)
+
+    return author_record(sort_key, surname, initials, orcid,
+            institution_code, institutions, status, institution_list,
+            code_list, countries, ())
+
+class author_model:
+    """The authors of a CSV file, parsed once: sorted by name, with their
+    institutions numbered in author order. Any number of formatters can
+    render the same model (see ta_auth.readAuthor), so producing several
+    output formats reads and sorts the author list only once."""
+    def __init__(self, authInFileName):
+        self.authInFileName = authInFileName
+        # see ta_auth
         self.author_data = []
-        # institution_ordinal is a dictionary of institution names where
-        # key is the full institution name and value is the order number.
-        # order number is based on author ordering
         self.institution_ordinal = {}
-        self.outFileName = outFileName
-        self.authInFileName = authInFileName
-        self.ackInFileName = ackInFileName
-
-        # stats
-        self.number_of_authors = 0
-        self.number_of_institutions = 0
-        self.number_of_countries = 0
-        self.institution_counter = Counter()
-        self.authors_in_country_counter = Counter()
-        self.institutions_in_country_counter = {}
-
-    def dumpPreamble(self):
-        pass
-
-    def dumpAcknowledge(self):
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'a')
-
-        with(open(self.ackInFileName, 'rb')) as fin:
-            for line in fin:
-                print(line.decode('utf8').strip())
+        self.institutions = []
 
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
+        # author_stats of the authors, computed when first asked for
+        self.statistics = None
 
-    def dumpFoot(self):
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'a')
-
-        print("\\end{document}")
-
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
-
-    def dumpAuthor(self):
-        """Prints the unordered list in simple block format. Use one of the
-        derived classes to print a sorted formated list."""
+        # acknowledgements file name -> list of its lines
+        self.acknowledgements = {}
 
-        if self.outFileName is not None:
-            origStdout = sys.stdout
-            sys.stdout = open(self.outFileName, 'w')
-
-        for sort_key, surname, initials, orcid, _, institution, status in \
-                self.author_data:
-            name = initials + ' ' + surname
-            print(name, '\t', orcid, '\t', institution, '\t', status)
-
-        if self.outFileName is not None:
-            sys.stdout.close()
-            sys.stdout = origStdout
-
-    def dump(self):
-        self.dumpPreamble()
-        self.dumpAuthor()
-        self.dumpAcknowledge()
-        self.dumpFoot()
-
-    def get_author_institution_numbers(self, institution):
-        """Given the string of institutions (each enclosed in {}), lookup the
-        corresponding institution number from the dictionary of unique
-        institution entries. Returns a sorted list of those institution
-        numbers."""
-
-        # institutions this author belongs to.
-        insts = []
-        for m in re.split('\} *\{', institution):
-            insts.append(m.strip('{}'))
-	# get the institution numbers from the dictionary
-        inst_num = []
-        for j in insts:
-            inst_num.append(self.institution_ordinal[j])
-
-        return sorted(inst_num)
+        self.readAuthor()
 
     def readAuthor(self):
         """Reads in the CSV file created from the master spreadsheet.
         Import the file using "File..., Download As.., .csv", then provide the
-        csv file as authInFileName to this method.
+        csv file as authInFileName to this class.
 
         The first row is the file header. Columns are ordered as
         1) Surname
@@ -131,17 +102,7 @@ class ta_auth:
             # the first line is a header (it should be)
             next(reader) # skip the first line
             for row in reader:
-                surname      = row[0].strip()
-                initials     = row[2].strip()
-                orcid        = row[3].strip()
-                institution_code = row[4].strip()
-                institutions = row[5].strip()
-                status       = row[6].strip()
-                # the author order is sorted according to 'last name, initials'
-                sort_key     = surname.upper() + ',' + initials.upper()
-
-                self.author_data.append((sort_key, surname, initials, orcid,
-                    institution_code, institutions, status))
+                self.author_data.append(compile_author(row))
 
         # ensure the list is sorted. this also effects institution numbers
         # when they are determined in a later function call. sorting a list
@@ -149,9 +110,8 @@ class ta_auth:
         # tuple.
         self.author_data.sort()
 
-        self.number_of_authors = len(self.author_data)
         self.sort_and_number_institutions()
-        self.stats_by_country()
+        self.statistics = None
 
     def sort_and_number_institutions(self):
         """Generate a unique list of institutions ordered by author name. key
@@ -161,68 +121,275 @@ class ta_auth:
         # list of institutions as they appear in the authorList (with repeated
         # entries.
         institutions = []
-        institution_codes = []
         for entry in self.author_data:
-            l = []
-            for m in re.split('\} *\{', entry[5]):
-                l.append(m.strip('{}'))
-            for inst in sorted(l):
-                institutions.append(inst)
-            
-            l = []
-            for m in re.split(',', entry[4]):
-                l.append(m.strip())
-            for inst in sorted(l):
-                institution_codes.append(inst)
-
-        # get a count of the number of authors from each institution
-        self.institution_counter = Counter(institution_codes)
-        self.number_of_institutions = len(self.institution_counter)
+            institutions.extend(sorted(entry.institution_list))
 
         # generate a unique list of institutions ordered by author
         # name. key is the institution name, value is the ordinal number
         unique_count = 0
         self.institution_ordinal = {}
+        self.institutions = []
         for j in institutions:
             if j not in self.institution_ordinal:
                 unique_count += 1
                 self.institution_ordinal[j] = unique_count
+                self.institutions.append(j)
+
+        # store the institution numbers of each author
+        for i, entry in enumerate(self.author_data):
+            self.author_data[i] = entry._replace(institution_numbers =
+                    tuple(sorted([self.institution_ordinal[j]
+                        for j in entry.institution_list])))
+
+    def stats(self):
+        """Returns the author_stats of the authors, computed the first time
+        they are asked for."""
+        if self.statistics is None:
+            self.statistics = author_stats(self.author_data)
+        return self.statistics
+
+    def read_acknowledgements(self, ackInFileName):
+        """Returns the lines of the acknowledgements file, read only the
+        first time they are asked for."""
+        if ackInFileName not in self.acknowledgements:
+            with(open(ackInFileName, 'rb')) as fin:
+                self.acknowledgements[ackInFileName] = [
+                        line.decode('utf8').strip() for line in fin]
+        return self.acknowledgements[ackInFileName]
+
+class author_stats:
+    """Counts of the authors by institution and by country, and of the
+    institutions by country, made in one pass over a list of author_records.
+    Institutions are counted by their codes."""
+    def __init__(self, author_data):
+        self.number_of_authors = len(author_data)
+        # institution code -> number of authors
+        self.institution_counter = Counter()
+        # country -> number of authors. an author in several institutions
+        # of one country is counted once.
+        self.authors_in_country_counter = Counter()
+        # country -> number of institutions
+        self.institutions_in_country_counter = Counter()
 
-    def stats_by_country(self):
-        countries = []
-        inst_and_country = []
-        for entry in self.author_data:
-            c = []
-            i = 0
-            for m in re.split('\} *\{', entry[5]):
-                institution = m.strip('{}')
-                country = re.split(',', institution)[-1].strip()
-                c.append(country)
-
-                icodes = re.split(',', entry[4])
-                inst_and_country.append((country, icodes[i].strip()))
-                i += 1
-
-            # some authors are in multiple institutions in the same country
-            # causing double counting. get a unique list of countries
-            # for the current author
-            for x in set(c):
-                countries.append(x)
-
-        self.authors_in_country_counter = Counter(countries)
+        seen = set()
+        for entry in author_data:
+            for code in sorted(entry.code_list):
+                self.institution_counter[code] += 1
+
+            for i, country in enumerate(entry.countries):
+                if (country, entry.code_list[i]) not in seen:
+                    seen.add((country, entry.code_list[i]))
+                    self.institutions_in_country_counter[country] += 1
+
+            for country in dict.fromkeys(entry.countries):
+                self.authors_in_country_counter[country] += 1
+
+        self.number_of_institutions = len(self.institution_counter)
         self.number_of_countries = len(self.authors_in_country_counter)
 
-        self.institutions_in_country_counter = {}
-        for k, v in Counter(inst_and_country).items():
-            self.institutions_in_country_counter[k[0]] = 0
-        for x in self.institutions_in_country_counter.keys():
-            for k, v in Counter(inst_and_country).items():
-                if x == k[0]:
-                    self.institutions_in_country_counter[x] += 1
-         
+    def table(self):
+        """Returns the stats as a list of (table, name, count) rows: the
+        totals, then the authors of each institution (most first) and the
+        authors and institutions of each country."""
+        rows = [('total', 'authors', self.number_of_authors),
+                ('total', 'institutions', self.number_of_institutions),
+                ('total', 'countries', self.number_of_countries)]
+        for k, v in self.institution_counter.most_common():
+            rows.append(('authors_per_institution', k, v))
+        for k, v in self.authors_in_country_counter.items():
+            rows.append(('authors_per_country', k, v))
+        for k, v in self.institutions_in_country_counter.items():
+            rows.append(('institutions_per_country', k, v))
+        return rows
+
+    def write(self, outFileName):
+        """Writes the table of stats to outFileName, as JSON if its name ends
+        in .json and as CSV otherwise."""
+        with io.open(outFileName, 'w', encoding = 'utf-8', newline = '') as f:
+            if outFileName.lower().endswith('.json'):
+                self.write_json(f)
+            else:
+                self.write_csv(f)
+
+    def write_csv(self, f):
+        """Writes the table of stats to the file object f as CSV, with a
+        header row."""
+        writer = csv.writer(f)
+        writer.writerow(('table', 'name', 'count'))
+        writer.writerows(self.table())
+
+    def write_json(self, f):
+        """Writes the table of stats to the file object f as a JSON object
+        with an object of names and counts for each table."""
+        tables = {}
+        for table, name, count in self.table():
+            tables.setdefault(table, {})[name] = count
+        json.dump(tables, f, indent = 2, ensure_ascii = False)
+        f.write('\n')
+
+class ta_auth:
+    """Base class for TA author data formatting classes."""
+    def __init__(self, authInFileName, ackInFileName,
+            outFileName = None, model = None):
+        # list of author_records, sorted by author name
+        self.author_data = []
+        # institution_ordinal is a dictionary of institution names where
+        # key is the full institution name and value is the order number.
+        # order number is based on author ordering
+        self.institution_ordinal = {}
+        # institution names in order of their numbers
+        self.institutions = []
+        self.outFileName = outFileName
+        self.authInFileName = authInFileName
+        self.ackInFileName = ackInFileName
+
+        # stats
+        self.number_of_authors = 0
+        self.number_of_institutions = 0
+        self.number_of_countries = 0
+        self.institution_counter = Counter()
+        self.authors_in_country_counter = Counter()
+        self.institutions_in_country_counter = Counter()
+
+        # the author_model rendered, read by readAuthor unless one is given
+        self.model = model
+
+        # stream the dump methods print to, sys.stdout if None. render and
+        # write set it to an in-memory buffer while they run.
+        self.out = None
+
+    def emit(self, *args):
+        """Prints args, as print does, to the output stream."""
+        print(*args, file = self.out if self.out is not None else sys.stdout)
+
+    def dumpParts(self, author_flag = True, ack_flag = True,
+            stub_only = False):
+        """Prints the authors (if author_flag) and acknowledgements (if
+        ack_flag), with the preamble and foot of a full document unless
+        stub_only is True."""
+        if author_flag and ack_flag:
+            self.dump()
+        elif author_flag and not ack_flag:
+            if not stub_only:
+                self.dumpPreamble()
+            self.dumpAuthor()
+            if not stub_only:
+                self.dumpFoot()
+        elif not author_flag and ack_flag:
+            if not stub_only:
+                self.dumpPreamble()
+            self.dumpAcknowledge()
+            if not stub_only:
+                self.dumpFoot()
+
+    def render(self, author_flag = True, ack_flag = True, stub_only = False):
+        """Returns the output of dumpParts as a string, without touching
+        sys.stdout or the output file."""
+        orig_out = self.out
+        self.out = io.StringIO()
+        try:
+            self.dumpParts(author_flag, ack_flag, stub_only)
+            return self.out.getvalue()
+        finally:
+            self.out = orig_out
+
+    def write(self, author_flag = True, ack_flag = True, stub_only = False):
+        """Writes the output of dumpParts to outFileName, or to sys.stdout
+        if it is None. The file is written once, when the output is
+        complete, by replacing it with a temporary file, so it is never
+        left partly written."""
+        text = self.render(author_flag, ack_flag, stub_only)
+        if self.outFileName is None:
+            sys.stdout.write(text)
+            return
+
+        tmp_name = self.outFileName + '.tmp'
+        with io.open(tmp_name, 'w', encoding = 'utf-8') as f:
+            f.write(text)
+        os.replace(tmp_name, self.outFileName)
+
+    def dumpPreamble(self):
+        pass
+
+    def dumpAcknowledge(self):
+        if self.model is not None:
+            for line in self.model.read_acknowledgements(self.ackInFileName):
+                self.emit(line)
+        else:
+            with(open(self.ackInFileName, 'rb')) as fin:
+                for line in fin:
+                    self.emit(line.decode('utf8').strip())
+
+    def dumpFoot(self):
+        self.emit("\\end{document}")
+
+    def dumpAuthor(self):
+        """Prints the unordered list in simple block format. Use one of the
+        derived classes to print a sorted formated list."""
+
+        for a in self.author_data:
+            name = a.initials + ' ' + a.surname
+            self.emit(name, '\t', a.orcid, '\t', a.institutions, '\t',
+                    a.status)
+
+    def dump(self):
+        self.dumpPreamble()
+        self.dumpAuthor()
+        self.dumpAcknowledge()
+        self.dumpFoot()
+
+    def get_author_institution_numbers(self, institution):
+        """Given the string of institutions (each enclosed in {}), lookup the
+        corresponding institution number from the dictionary of unique
+        institution entries. Returns a sorted list of those institution
+        numbers."""
+
+        # get the institution numbers from the dictionary
+        inst_num = []
+        for j in split_institutions(institution):
+            inst_num.append(self.institution_ordinal[j])
+
+        return sorted(inst_num)
+
+    def readAuthor(self):
+        """Reads in the CSV file created from the master spreadsheet (see
+        author_model), unless the formatter was given an author_model, and
+        takes its authors and institution numbers. The stats are only
+        computed by stats_by_country."""
+        if self.model is None:
+            self.model = author_model(self.authInFileName)
+        self.use_model()
+
+    def use_model(self):
+        m = self.model
+        self.author_data = m.author_data
+        self.institution_ordinal = m.institution_ordinal
+        self.institutions = m.institutions
+
+    def sort_and_number_institutions(self):
+        """See author_model.sort_and_number_institutions."""
+        if self.model is None:
+            self.readAuthor()
+        self.model.sort_and_number_institutions()
+        self.use_model()
+
+    def stats_by_country(self):
+        """Takes the author_stats of the model, computing them the first
+        time they are asked for, and returns them."""
+        if self.model is None:
+            self.readAuthor()
+        stats = self.model.stats()
+        self.number_of_authors = stats.number_of_authors
+        self.number_of_institutions = stats.number_of_institutions
+        self.number_of_countries = stats.number_of_countries
+        self.institution_counter = stats.institution_counter
+        self.authors_in_country_counter = stats.authors_in_country_counter
+        self.institutions_in_country_counter = \
+                stats.institutions_in_country_counter
+        return stats
+
     def stats_by_institution(self):
-        if len(self.institution_counter) == 0:
-            self.sort_and_number_institutions()
+        self.stats_by_country()
 
         #for k,v in sorted(self.institution_counter.items(),
         #        key=operator.itemgetter(1), reverse = True):
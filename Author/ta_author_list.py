@@ -36,13 +36,12 @@ then provide those files as input using --csvfile and --ackfile.
 
 import argparse
 import io
-import matplotlib.pyplot as plt
-import numpy as np
 import os
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
 
 from formats import ta_auth
 from formats import aastex
@@ -66,32 +65,105 @@ __maintainer  = 'William Hanlon'
 __email__     = 'whanlon@cosmic.utah.edu'
 __status__    = 'Production'
 
+# output formats: name -> (formatter class, extension of its output file
+# when several formats are written)
+FORMATS = {
+    'plainLatex': (plain_latex.plain_latex, '.tex'),
+    'plainText': (ta_auth.ta_auth, '.txt'),
+    'authblk': (authblk.authblk, '.tex'),
+    'aastex': (aastex.aastex, '.tex'),
+    'arxiv': (arxiv.arxiv, '.txt'),
+    'revtex': (revtex.revtex, '.tex'),
+    }
+
+# formats written by --format all
+ALL_FORMATS = ['aastex', 'revtex', 'authblk', 'arxiv', 'plainLatex']
+
+# the google api modules are only needed to read from the cloud and take a
+# large share of the startup time, so they are imported by
+# load_cloud_modules when first needed. matplotlib and numpy are imported
+# by plot_stats for the same reason.
 moduleLoaded = {}
 
-# attempt to import google api modules
-try:
-    import httplib2
-except ImportError:
-    moduleLoaded['httplib2'] = False
-else:
-    moduleLoaded['httplib2'] = True
-
-try:
-    from apiclient import discovery
-    from apiclient.http import MediaIoBaseDownload
-except ImportError:
-    moduleLoaded['apiclient'] = False
-else:
-    moduleLoaded['apiclient'] = True
-
-try:
-    from oauth2client import client
-    from oauth2client import tools
-    from oauth2client.file import Storage
-except ImportError:
-    moduleLoaded['oauth2client'] = False
-else:
-    moduleLoaded['oauth2client'] = True
+def load_cloud_modules():
+    """Import the google api modules if they aren't yet. Returns the list
+    of the modules that failed to load."""
+    global httplib2, discovery, MediaIoBaseDownload, client, tools, Storage
+
+    if not moduleLoaded:
+        try:
+            import httplib2
+        except ImportError:
+            moduleLoaded['httplib2'] = False
+        else:
+            moduleLoaded['httplib2'] = True
+
+        try:
+            from apiclient import discovery
+            from apiclient.http import MediaIoBaseDownload
+        except ImportError:
+            moduleLoaded['apiclient'] = False
+        else:
+            moduleLoaded['apiclient'] = True
+
+        try:
+            from oauth2client import client
+            from oauth2client import tools
+            from oauth2client.file import Storage
+        except ImportError:
+            moduleLoaded['oauth2client'] = False
+        else:
+            moduleLoaded['oauth2client'] = True
+
+    return [k for k, v in moduleLoaded.items() if v == False]
+
+def add_auth_arguments(parser):
+    """Add the command line flags of oauth2client.tools.argparser to parser,
+    so that oauth2client is only imported when reading from the cloud."""
+    parser.add_argument('--auth_host_name', default='localhost',
+            help='Hostname when running a local web server.')
+    parser.add_argument('--noauth_local_webserver', action='store_true',
+            default=False, help='Do not run a local web server.')
+    parser.add_argument('--auth_host_port', default=[8080, 8090], type=int,
+            nargs='*', help='Port web server should listen on.')
+    parser.add_argument('--logging_level', default='ERROR',
+            choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+            help='Set the logging level of detail.')
+
+def profile_imports(argv):
+    """Run this program with the arguments argv under python -X importtime
+    and report the wall time and the imports that took the longest."""
+    cmd = [sys.executable, '-X', 'importtime', os.path.abspath(__file__)]
+    cmd += argv
+    start = time.time()
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE, universal_newlines=True)
+    wall = time.time() - start
+
+    # lines are 'import time: self [us] | cumulative | imported package'
+    imports = []
+    other = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            other.append(line)
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            imports.append((int(fields[1]), int(fields[0]),
+                fields[2][1:].rstrip()))
+        except ValueError:
+            continue
+
+    for line in other:
+        print(line, file=sys.stderr)
+    print('wall time: %.1f ms' % (1000.*wall))
+    print('import time of top level modules: %.1f ms' % (sum(c for c, _, name
+        in imports if not name.startswith(' ')) / 1000.))
+    print('%12s %12s  %s' % ('cumul. (ms)', 'self (ms)', 'module'))
+    for cumulative, self_us, name in sorted(imports, reverse=True)[:20]:
+        print('%12.1f %12.1f  %s' % (cumulative / 1000., self_us / 1000.,
+            name))
+    return proc.returncode
 
 #SCOPES = 'https://www.googleapis.com/auth/drive.metadata.readonly'
 #CLIENT_SECRET_FILE = 'client_secret_taauth.json'
@@ -135,13 +207,11 @@ def getCloudData(args, docID, mimeType, outFileName):
     
     This function returns the name of the output file."""
 
-    if (moduleLoaded['httplib2'] == False or
-        moduleLoaded['apiclient'] == False or
-        moduleLoaded['oauth2client'] == False):
+    missing = load_cloud_modules()
+    if missing:
         modMissing = ''
-        for k, v in moduleLoaded.items():
-            if v == False:
-                modMissing += k + ' '
+        for k in missing:
+            modMissing += k + ' '
 
         sys.stderr.write('%s: Trying to read from the cloud, the following '
             'modules failed to load: %s\n' % (args.csvfile, modMissing))
@@ -187,28 +257,23 @@ def getCloudData(args, docID, mimeType, outFileName):
 
     return outFileName
 
-def makePDF(inputCsvFileName, inputAckFileName, pdfFileName):
-    """Make a PDF file that contains the author list and acknowledgements."""
+def makePDF(inputCsvFileName, inputAckFileName, pdfFileName, model=None):
+    """Make a PDF file that contains the author list and acknowledgements.
+    If the author_model model is given, its authors are used instead of
+    reading the CSV file again."""
     pdfAbsPath = os.path.abspath(pdfFileName)
     ocwd = os.getcwd()
     tempDir = tempfile.mkdtemp()
     tempFileName = os.path.join(tempDir, 'ta_auth_temp.tex')
 
     author_list = authblk.authblk(inputCsvFileName, inputAckFileName,
-            tempFileName)
+            tempFileName, model=model)
 
     if inputCsvFileName is not None:
         author_list.readAuthor()
 
-    author_list.dumpPreamble()
-
-    if inputCsvFileName is not None:
-        author_list.dumpAuthor()
-
-    if inputAckFileName is not None:
-        author_list.dumpAcknowledge()
-
-    author_list.dumpFoot()
+    author_list.write(inputCsvFileName is not None,
+            inputAckFileName is not None)
 
     os.chdir(tempDir)
     subprocess.call(['pdflatex', 'ta_auth_temp.tex'])
@@ -216,10 +281,44 @@ def makePDF(inputCsvFileName, inputAckFileName, pdfFileName):
     os.chdir(ocwd)
     shutil.rmtree(tempDir)
 
+def output_file_name(output, fmt):
+    """Returns the name of the file the format fmt is written to when
+    several formats are output: output (ta_author if None) with the format
+    name added before its extension."""
+    if output is None:
+        output = 'ta_author'
+    root, ext = os.path.splitext(output)
+    return root + '_' + fmt + (ext or FORMATS[fmt][1])
+
+def plot_stats(c):
+    """Plot the number of authors of each institution in the Counter c."""
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    # sort institutions by number of authors
+    sorted_c = c.most_common();
+    bar_ind = np.arange(len(c))
+    #bar_x = c.keys()
+    #bar_y = c.values()
+    bar_x = list(zip(*sorted_c))[0]
+    bar_y = list(zip(*sorted_c))[1]
+    width = 0.95
+
+    fig = plt.figure(figsize=(15, 9))
+    ax = fig.add_subplot(111)
+    ax.bar(bar_ind, bar_y, width=width)
+    ax.set_xticks(bar_ind)
+    ax.set_xticklabels(bar_x, rotation=45, rotation_mode='anchor',
+            ha='right')
+    ax.set_title('TA Authors by Institution')
+    ax.set_xlabel('Institution')
+    ax.set_ylabel('Number of Authors')
+    plt.show()
+
 def main():
     # now if 'csvfile' or 'ackfile' is empty assume the user wants to
     # read the spreadsheet directly from the cloud
-    parser = argparse.ArgumentParser(parents=[tools.argparser],
+    parser = argparse.ArgumentParser(
             description='Sort the TA Author list in alphabetical order and '
             'affiliations in numerical '
             'order and output a working LaTeX skeleton file. If file is '
@@ -233,14 +332,20 @@ def main():
             help = 'TA Author list input file name in CSV format')
     parser.add_argument('--ackfile',
             help = 'TA acknowledgements input file name in plain text format')
-    parser.add_argument('--format', choices=['plainLatex', 'plainText',
-        'authblk', 'aastex', 'arxiv', 'revtex'], default='plainLatex',
-        help='select the output format')
+    parser.add_argument('--format', choices=sorted(FORMATS) + ['all'],
+        nargs='+', default=['plainLatex'], help='select the output format. '
+        'several formats (or all: %s) are rendered from one reading of the '
+        'author list, each into its own file named after --output '
+        '(default: ta_author) and the format' % ', '.join(ALL_FORMATS))
     parser.add_argument('--stub-only', help='do not try to create a full '
             'LaTeX document, only output the relevant parts (author and/or '
             'acknowledgements)', default=False, action='store_true')
     parser.add_argument('--stats', help='dump counts of institutions and '
             'generate plot', action='store_true', default=False)
+    parser.add_argument('--stats-output', help='write the counts of authors '
+            'by institution and country and of institutions by country to '
+            'this file, as JSON if its name ends in .json and as CSV '
+            'otherwise')
     parser.add_argument('--output', help='select the file to write to. '
             'if not provided, output is directed to STDOUT')
     parser.add_argument('--pdf', help='generate a PDF version of the '
@@ -255,9 +360,27 @@ def main():
     parser.add_argument('--saveack', action='store_true', default=False,
         help='save downloaded acknowledgements to ta_acknowledgements.txt when '
         'reading from the cloud')
+    parser.add_argument('--profile-imports', action='store_true',
+        default=False, help='run with the other arguments given and report '
+        'where the startup time goes (python -X importtime)')
+    add_auth_arguments(parser)
 
     args = parser.parse_args()
 
+    if args.profile_imports:
+        sys.exit(profile_imports([a for a in sys.argv[1:]
+            if a != '--profile-imports']))
+
+    # set the flag defaults. argparse is designed for easy toggling of multiple
+    # booleans at the same time.
+    author_flag = True
+    ack_flag = False
+    if args.include_ack:
+        ack_flag = True
+    if args.ack_only:
+        author_flag = False
+        ack_flag = True
+
     # if no file on the command line is given, try to read from my
     # Google Drive
     if args.csvfile is None:
@@ -276,7 +399,10 @@ def main():
     else:
         inputCsvFile = args.csvfile
 
-    if args.ackfile is None:
+    # the acknowledgements are only read from the cloud if they are output
+    if args.ackfile is None and not ack_flag:
+        inputAckFile = None
+    elif args.ackfile is None:
         # get the spreadsheet id from a local file
         try:
             with open(ACKNOWLEDGEMENTS_ID_FILE, 'r') as f:
@@ -297,92 +423,54 @@ def main():
     else:
         inputAckFile = args.ackfile
 
-    # invoke the template that produces the output based on what LaTeX
-    # style the used requested.
-    #
-    # if args.output is None, then it prints the output to stdout.
-    if args.format == 'plainLatex':
-        author_list = plain_latex.plain_latex(inputCsvFile, inputAckFile,
-                args.output)
-    elif args.format == 'authblk':
-        author_list = authblk.authblk(inputCsvFile, inputAckFile, args.output)
-    elif args.format == 'aastex':
-        author_list = aastex.aastex(inputCsvFile, inputAckFile, args.output)
-    elif args.format == 'arxiv':
-        author_list = arxiv.arxiv(inputCsvFile, inputAckFile, args.output)
-    elif args.format == 'revtex':
-        author_list = revtex.revtex(inputCsvFile, inputAckFile, args.output)
-    else:
-        author_list = ta_auth.ta_auth(inputCsvFile, inputAckFile, args.output)
+    formats = []
+    for f in args.format:
+        for g in (ALL_FORMATS if f == 'all' else [f]):
+            if g not in formats:
+                formats.append(g)
 
     # readAuthor reads in the author CSV file and processes it quite a bit
     # to alphabetize and number institutions in order as they appear in the
-    # author list.
-    author_list.readAuthor()
+    # author list. it is read once and rendered in every format.
+    model = ta_auth.author_model(inputCsvFile)
     # there is no readAcknowledgements because we'll just dump the simple
     # contents of the file pointed to by inputAckFile to args.output
 
-    # set the flag defaults. argparse is designed for easy toggling of multiple
-    # booleans at the same time.
-    author_flag = True
-    ack_flag = False
-    if args.include_ack:
-        ack_flag = True
-    if args.ack_only:
-        author_flag = False
-        ack_flag = True
-
-    if author_flag and ack_flag:
-        author_list.dump()
-    elif author_flag and not ack_flag:
-        if not args.stub_only:
-            author_list.dumpPreamble()
-        author_list.dumpAuthor()
-        if not args.stub_only:
-            author_list.dumpFoot()
-    elif not author_flag and ack_flag:
-        if not args.stub_only:
-            author_list.dumpPreamble()
-        author_list.dumpAcknowledge()
-        if not args.stub_only:
-            author_list.dumpFoot()
+    for f in formats:
+        # invoke the template that produces the output based on what LaTeX
+        # style the used requested.
+        #
+        # if the output file name is None, then it prints the output to
+        # stdout.
+        outFileName = args.output
+        if len(formats) > 1:
+            outFileName = output_file_name(args.output, f)
+        author_list = FORMATS[f][0](inputCsvFile, inputAckFile, outFileName,
+                model=model)
+        author_list.readAuthor()
+        author_list.write(author_flag, ack_flag, args.stub_only)
 
     if args.pdf:
         if author_flag and ack_flag:
-            makePDF(inputCsvFile, inputAckFile, args.pdf)
+            makePDF(inputCsvFile, inputAckFile, args.pdf, model)
         elif author_flag and not ack_flag:
-            makePDF(inputCsvFile, None, args.pdf)
+            makePDF(inputCsvFile, None, args.pdf, model)
         elif not author_flag and ack_flag:
-            makePDF(None, inputAckFile, args.pdf)
+            makePDF(None, inputAckFile, args.pdf, model)
 
+    # the stats are only computed if they are asked for
     if (args.stats):
         print('')
         author_list.stats_by_institution()
-        c = author_list.institution_counter
-        # sort institutions by number of authors
-        sorted_c = c.most_common();
-        bar_ind = np.arange(len(c))
-        #bar_x = c.keys()
-        #bar_y = c.values()
-        bar_x = list(zip(*sorted_c))[0]
-        bar_y = list(zip(*sorted_c))[1]
-        width = 0.95
-
-        fig = plt.figure(figsize=(15, 9))
-        ax = fig.add_subplot(111)
-        ax.bar(bar_ind, bar_y, width=width)
-        ax.set_xticks(bar_ind)
-        ax.set_xticklabels(bar_x, rotation=45, rotation_mode='anchor',
-                ha='right')
-        ax.set_title('TA Authors by Institution')
-        ax.set_xlabel('Institution')
-        ax.set_ylabel('Number of Authors')
-        plt.show()
+        plot_stats(author_list.institution_counter)
 
+    if args.stats_output:
+        author_list.stats_by_country().write(args.stats_output)
 
     if args.csvfile is None and args.savecsv == False:
         os.unlink(inputCsvFile)
-    if args.ackfile is None and args.saveack == False:
+    if (args.ackfile is None and args.saveack == False and
+            inputAckFile is not None):
         os.unlink(inputAckFile)
 
 
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Benchmark the dark period engines and check them against a frozen
+reference table.
+
+Each engine computes the nights of a single night, a month, a year and ten
+years from a fixed date at every site, with the dark cache disabled:
+"ephem" makes the PyEphem searches of each night one at a time, "index"
+looks the transitions up in a dark.ephemIndex as dark does for ranges, and
+"grid" uses darkgrid.gridEngine. The wall time of each query is printed
+with the time and the number of ephemeris calls per night (PyEphem
+searches, or evaluations of the Sun and Moon positions for grid).
+
+Every engine is then checked against the nights of reference.csv, written
+by the PyEphem searches with --reference. A night fails if only one of the
+two has a dark period or their starts or stops differ by more than
+--tolerance seconds, and the program exits with status 1 if any night
+fails, so faster engines can be adopted safely.
+
+With --criteria, the darkcriteria summaries of a year at Middle Drum are
+checked instead: the dark nights, run nights and dark hours mustn't fall
+as the Moon thresholds are loosened, and a night where a looser crescent
+limit adds a short dark period before the long one must keep its long one.
+
+Example:
+    ./benchmark.py -p night -p month -p year
+    ./benchmark.py --check -e grid -t 5
+    ./benchmark.py --criteria
+"""
+
+__author__  = "William Hanlon"
+__email__   = "whanlon@cosmic.utah.edu"
+__version__ = "1.0.0."
+
+import csv
+import datetime
+import getopt
+import os
+import sys
+import time
+
+import dark
+import darkcalendar
+import darkcriteria
+
+# the frozen reference table
+referencePath = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+        "reference.csv")
+
+# the nights of the reference table: every referenceStep-th night from
+# referenceStart up to referenceStop at each site
+referenceStart = datetime.date(2015, 1, 1)
+referenceStop = datetime.date(2031, 1, 1)
+referenceStep = 10
+
+# first night of the timed queries, and their lengths in nights
+queryStart = datetime.datetime(2024, 1, 1, 23, 59, 0)
+spans = (("night", 1), ("month", 30), ("year", 365), ("decade", 3652))
+
+engines = ("ephem", "index", "grid")
+
+def _dark():
+    """Return a dark object that doesn't use the cache."""
+    d = dark.dark()
+    d.cachePath = None
+    return d
+
+def engineNights(engine, site, dates):
+    """Return the darkNights of the dates (datetimes, in order) at the site
+    computed by the engine, and the number of ephemeris calls made."""
+    d = _dark()
+    d.optSite = site
+    if (engine == "grid"):
+        # imported here so the PyEphem engines don't need NumPy
+        import darkgrid
+        g = darkgrid.gridEngine(d)
+        nights = g.nights(dates[0], dates[-1] + datetime.timedelta(days = 1))
+        byDate = dict([(night.date, night) for night in nights])
+        return [byDate[date.date()] for date in dates], g.nCalls
+
+    index = None
+    if (engine == "index"):
+        index = dark.ephemIndex(d.site[site], dates[0], dates[-1])
+        d.index[site] = index
+    nights = [d._night(date, False) for date in dates]
+    nCalls = d.nCalls
+    if (index is not None):
+        nCalls += index.nCalls
+    return nights, nCalls
+
+def timeQuery(engine, site, n):
+    """Return the wall time (s) and number of ephemeris calls of the
+    engine's query of n nights from queryStart at the site."""
+    dates = [queryStart + datetime.timedelta(days = i) for i in range(n)]
+    t = time.time()
+    nights, nCalls = engineNights(engine, site, dates)
+    return time.time() - t, nCalls
+
+def referenceDates(site):
+    """Return the dates (datetimes) of the reference nights of a site."""
+    dates = []
+    date = referenceStart
+    while (date < referenceStop):
+        dates.append(datetime.datetime.combine(date,
+            darkcalendar.runCalendar.time))
+        date += datetime.timedelta(days = referenceStep)
+    return dates
+
+def writeReference(sites):
+    """Write the reference table of the sites from the PyEphem searches."""
+    writer = dark.nightWriter("csv", referencePath)
+    for site in sites:
+        nights, nCalls = engineNights("ephem", site, referenceDates(site))
+        for night in nights:
+            writer.write(night)
+    writer.close()
+
+def readReference():
+    """Return a dictionary of the reference nights of each site."""
+    reference = {}
+    with open(referencePath, newline = "") as f:
+        for row in csv.DictReader(f):
+            night = darkcalendar.readNight(row)
+            reference.setdefault(night.site, []).append(night)
+    return reference
+
+def check(engine, reference, tolerance):
+    """Return the number of nights, the number of failed nights and the
+    largest start and stop differences (s) of the engine's nights from the
+    reference (a list of the darkNights of one site)."""
+    site = reference[0].site
+    dates = [datetime.datetime.combine(night.date,
+        darkcalendar.runCalendar.time) for night in reference]
+    nights, nCalls = engineNights(engine, site, dates)
+
+    failed = 0
+    maxStart = 0.
+    maxStop = 0.
+    for got, ref in zip(nights, reference):
+        if ((got.start is None) != (ref.start is None)):
+            failed += 1
+            continue
+        if (got.start is None):
+            continue
+        dStart = abs((got.start - ref.start).total_seconds())
+        dStop = abs((got.stop - ref.stop).total_seconds())
+        maxStart = max(maxStart, dStart)
+        maxStop = max(maxStop, dStop)
+        if (dStart > tolerance or dStop > tolerance):
+            failed += 1
+    return len(reference), failed, maxStart, maxStop
+
+# the year of the criteria check, and a night in it where an illumination
+# fraction of 0.2 below 10 degrees adds a 15 minute dark period before
+# the night's 3.5 hour one
+criteriaSite = "md"
+criteriaStart = datetime.datetime(2024, 1, 1)
+criteriaNight = 132
+criteriaIllum = [0., 0.1, 0.2]
+criteriaCrescent = [0., 5., 10.]
+
+def checkCriteria():
+    """Return the number of failed checks of the darkcriteria summaries of
+    the criteria year, printing the summary of each threshold pair."""
+    d = _dark()
+    table = darkcriteria.nightTable(d, criteriaSite, criteriaStart, 366)
+    failed = 0
+    print("%5s %8s %7s %7s %9s %10s  %s" % ("illum", "crescent", "dark",
+        "runs", "hours", "night %d" % criteriaNight, "status"))
+    results = {}
+    for i, illum in enumerate(criteriaIllum):
+        for j, crescent in enumerate(criteriaCrescent):
+            criteria = darkcriteria.darkCriteria(moonIllumination = illum,
+                    crescentAltitude = crescent)
+            first, last, total = criteria.evaluate(table)
+            result = darkcriteria.summary(criteria, table, d.minDarkTime)
+            # looser thresholds mustn't lose nights, runs or hours
+            ok = all(min(a - b for a, b in zip(result, results[prev][0]))
+                    >= 0 for prev in ((i, j - 1), (i - 1, j))
+                    if prev in results)
+            results[(i, j)] = (result, first[criteriaNight],
+                    last[criteriaNight])
+            # the night's period mustn't move off its long stretch
+            ok &= results[(i, j)][1:] == results[(0, 0)][1:]
+            failed += not ok
+            print("%5.1f %8.0f %7d %7d %9.1f %4d-%-5d  %s" % (illum, crescent,
+                result[0], result[1], result[2], first[criteriaNight],
+                last[criteriaNight], "ok" if ok else "failed"))
+    return failed
+
+def usage():
+    print("usage: %s [OPTION]" % os.path.basename(sys.argv[0]))
+    print("  -c --check\tOnly check the engines against the reference " +
+            "table.")
+    print("  --criteria\tOnly check the darkcriteria summaries.")
+    print("  -e --engine\tEngine to run: %s (Default: all). " %
+            ", ".join(engines) + "Repeat for more.")
+    print("  -h --help\tPrint this message and exit.")
+    print("  -p --span\tQuery to time: %s (Default: all). " %
+            ", ".join([s[0] for s in spans]) + "Repeat for more.")
+    print("  --reference\tWrite the reference table (%s) and exit." %
+            os.path.basename(referencePath))
+    print("  -s --site\tSite to run (Default: all). Repeat for more.")
+    print("  -t --tolerance\tLargest start or stop difference from the " +
+            "reference in")
+    print("\t\tseconds (Default: 5).")
+
+def main(argv = None):
+    """Time the engines and check them against the reference table."""
+    if (argv is None):
+        argv = sys.argv
+    pname = os.path.basename(argv[0])
+
+    try:
+        cOpts, cArgs = getopt.gnu_getopt(argv[1:], "ce:hp:s:t:",
+                ["check", "criteria", "engine=", "help", "reference", "site=", "span=",
+                    "tolerance="])
+    except getopt.GetoptError as msg:
+        print("%s: %s" % (pname, msg), file = sys.stderr)
+        usage()
+        return 1
+
+    sites = sorted(dark.dark().site.keys())
+    optEngines = []
+    optSites = []
+    optSpans = []
+    optCheck = False
+    optCriteria = False
+    optReference = False
+    tolerance = 5.
+    for (opt, arg) in cOpts:
+        if (opt in ("-c", "--check")):
+            optCheck = True
+        elif (opt == "--criteria"):
+            optCriteria = True
+        elif (opt in ("-e", "--engine")):
+            if (arg not in engines):
+                print("%s: Invalid engine (%s)" % (pname, arg),
+                        file = sys.stderr)
+                return 1
+            optEngines.append(arg)
+        elif (opt in ("-h", "--help")):
+            usage()
+            return 0
+        elif (opt in ("-p", "--span")):
+            if (arg not in dict(spans)):
+                print("%s: Invalid span (%s)" % (pname, arg),
+                        file = sys.stderr)
+                return 1
+            optSpans.append(arg)
+        elif (opt == "--reference"):
+            optReference = True
+        elif (opt in ("-s", "--site")):
+            if (arg not in sites):
+                print("%s: Invalid site (%s)" % (pname, arg),
+                        file = sys.stderr)
+                return 1
+            optSites.append(arg)
+        elif (opt in ("-t", "--tolerance")):
+            try:
+                tolerance = float(arg)
+            except ValueError:
+                print("%s: Invalid tolerance (%s)" % (pname, arg),
+                        file = sys.stderr)
+                return 1
+
+    optEngines = optEngines or list(engines)
+    optSites = optSites or sites
+
+    if (optReference):
+        writeReference(sites)
+        return 0
+
+    if (optCriteria):
+        failed = checkCriteria()
+        if (failed):
+            print("%d check(s) failed" % failed)
+            return 1
+        return 0
+
+    if (not optCheck):
+        print("%-4s %-7s %-6s %10s %14s %12s" % ("site", "span", "engine",
+            "wall (s)", "per night (ms)", "calls/night"))
+        for site in optSites:
+            for span, n in spans:
+                if (optSpans and span not in optSpans):
+                    continue
+                for engine in optEngines:
+                    wall, nCalls = timeQuery(engine, site, n)
+                    print("%-4s %-7s %-6s %10.3f %14.3f %12.1f" % (site, span,
+                        engine, wall, 1000.*wall/n, float(nCalls)/n))
+                    sys.stdout.flush()
+        print("")
+
+    reference = readReference()
+    failed = 0
+    print("%-4s %-6s %7s %7s %14s %13s  %s" % ("site", "engine", "nights",
+        "failed", "max start (s)", "max stop (s)", "status"))
+    for site in optSites:
+        for engine in optEngines:
+            n, nFailed, maxStart, maxStop = check(engine, reference[site],
+                    tolerance)
+            failed += nFailed
+            print("%-4s %-6s %7d %7d %14.1f %13.1f  %s" % (site, engine, n,
+                nFailed, maxStart, maxStop, "failed" if nFailed else "ok"))
+            sys.stdout.flush()
+
+    if (failed):
+        print("%d night(s) failed" % failed)
+        return 1
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
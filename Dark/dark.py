@@ -0,0 +1,1165 @@
+#!/usr/bin/env python3
+"""Calculate dark and run times for Telescope Array fluorescence detectors.
+
+The dark class can be imported and reused: sites, the ephemeris index and
+the cache are kept across calls. PyEphem is imported on first use only, so
+dark periods that are already in the cache are returned without it. See
+the dark script for the command line interface."""
+
+__author__  = "William Hanlon"
+__email__   = "whanlon@cosmic.utah.edu"
+__version__ = "1.0.0."
+
+import bisect
+import collections
+import csv
+import datetime
+import getopt
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+
+# PyEphem, imported by _ephem when first needed
+ephem = None
+
+def _ephem():
+    """Import PyEphem if it isn't yet and return it."""
+    global ephem
+    if (ephem is None):
+        import ephem
+    return ephem
+
+# ephem dates count days from 1899-12-31 12:00 UTC, 2209032000 s before the
+# Unix epoch
+_unixEpoch = datetime.datetime(1970, 1, 1)
+
+def _seconds(date):
+    """Return the Unix time of the ephem date (a float) as whole seconds and
+    microseconds, as PyEphem does."""
+    microseconds = int(round(24*60*60*1000000*float(date)))
+    seconds, microseconds = divmod(microseconds, 1000000)
+    return seconds - 2209032000, microseconds
+
+def utcTime(date):
+    """Return the ephem date (a float) as a naive UTC datetime."""
+    seconds, microseconds = _seconds(date)
+    return _unixEpoch + datetime.timedelta(seconds = seconds,
+            microseconds = microseconds)
+
+def localTime(date):
+    """Return the ephem date (a float) as a naive local datetime, as
+    ephem.localtime does."""
+    seconds, microseconds = _seconds(date)
+    return datetime.datetime.fromtimestamp(seconds).replace(
+            microsecond = microseconds)
+
+class fdSite:
+    """Location of a fluorescence detector. Its ephem.Observer is only
+    created when it is first needed."""
+
+    def __init__(self, name, lat, long, elevation, horizon = 0.):
+        self.name = name
+        self.lat = lat                  # degrees, as a string
+        self.long = long                # degrees, as a string
+        self.elevation = elevation      # m
+        self.horizon = horizon          # degrees
+        self._observer = None
+
+    def key(self):
+        """Return a string describing the site definition."""
+        return "%s %s %r %r" % (self.lat, self.long, self.elevation,
+                self.horizon)
+
+    def observer(self):
+        """Return the ephem.Observer of the site."""
+        if (self._observer is None):
+            _ephem()
+            obs = ephem.Observer()
+            obs.name = self.name
+            obs.lat = self.lat
+            obs.long = self.long
+            obs.elevation = self.elevation
+            obs.horizon = self.horizon
+            self._observer = obs
+        return self._observer
+
+class astroEvent:
+    def __init__(self):
+        self.title = None
+        self.dt    = None
+        self.eventFlag = None
+
+    def __str__(self):
+        return ("(title: %s, dt: %s, eventFlag: %s)" %
+                (str(self.title), str(self.dt), str(self.eventFlag)))
+        #retstr = ""
+        #for k, v in self.__dict__.iteritems():
+        #    retstr += ("%s: %s, " % (k, str(v)))
+        #return retstr
+
+    def __repr__(self):
+        return self.__str__()
+
+# the rising and setting events that bracket a date. each is (key, title,
+# body, rising, previous, twilight). twilight events are the rising and
+# setting of the center of the Sun through a horizon at -18 degrees.
+eventDefs = (
+    ("moonSetPrev", "Previous moon set", "Moon", False, True, False),
+    ("moonRisePrev", "Previous moon rise", "Moon", True, True, False),
+    ("moonSetNext", "Next moon set", "Moon", False, False, False),
+    ("moonRiseNext", "Next moon rise", "Moon", True, False, False),
+    ("sunRisePrev", "Previous Sun rise", "Sun", True, True, False),
+    ("sunSetPrev", "Previous Sun set", "Sun", False, True, False),
+    ("sunSetNext", "Next Sun set", "Sun", False, False, False),
+    ("sunRiseNext", "Next Sun rise", "Sun", True, False, False),
+    ("astroTwilightBeginPrev", "Previous astro twilight begins", "Sun",
+        True, True, True),
+    ("astroTwilightEndPrev", "Previous astro twilight ends", "Sun",
+        False, True, True),
+    ("astroTwilightEndNext", "Next astro twilight ends", "Sun",
+        False, False, True),
+    ("astroTwilightBeginNext", "Next astro twilight begins", "Sun",
+        True, False, True),
+    )
+
+class ephemIndex:
+    """Index of the Sun, Moon and astronomical twilight transitions at a site.
+
+    The rising and setting times of each body are generated in one forward
+    sweep over a date range and kept in sorted lists, so the previous and
+    next transitions of any date in the range are found with a bisect
+    instead of a root find each. The first lookup sweeps the range from
+    start to stop (datetimes), if given, and the range is extended (by at
+    least chunk days) whenever a date outside of it is looked up. site is an
+    fdSite."""
+
+    # transitions used by a lookup are at most this many days from the date
+    margin = 3.
+
+    def __init__(self, site, start = None, stop = None, chunk = 31.):
+        self.site = site
+        self.chunk = chunk
+        self.start = None
+        self.stop = None
+
+        # range swept by the first lookup
+        self.hint = (start, stop or start)
+
+        # (body, rising, twilight) -> sorted list of ephem.Date
+        self.times = {}
+        for key, title, body, rising, previous, twilight in eventDefs:
+            self.times[(body, rising, twilight)] = []
+
+        # number of rising/setting searches made
+        self.nCalls = 0
+
+    def _sweep(self, start, stop):
+        """Return the transitions of every kind in [start, stop)."""
+        obs = self.site.observer().copy()
+        times = {}
+        for kind in self.times.keys():
+            body, rising, twilight = kind
+            if (twilight):
+                obs.horizon = "-18."
+            else:
+                obs.horizon = 0.
+            b = getattr(ephem, body)()
+
+            t = []
+            obs.date = start
+            while (True):
+                if (rising):
+                    dt = obs.next_rising(b, use_center = twilight)
+                else:
+                    dt = obs.next_setting(b, use_center = twilight)
+                self.nCalls += 1
+                if (dt >= stop):
+                    break
+                t.append(dt)
+                obs.date = dt + ephem.minute
+            times[kind] = t
+        return times
+
+    def cover(self, start, stop = None):
+        """Extend the index so that it answers lookups of every date from
+        start to stop (datetimes)."""
+        _ephem()
+        if (stop is None):
+            stop = start
+        start = ephem.Date(ephem.Date(start) - self.margin)
+        stop = ephem.Date(ephem.Date(stop) + self.margin)
+
+        if (self.start is None):
+            if (self.hint[0] is not None):
+                start = ephem.Date(min(start,
+                    ephem.Date(self.hint[0]) - self.margin))
+                stop = ephem.Date(max(stop,
+                    ephem.Date(self.hint[1]) + self.margin))
+            self.times = self._sweep(start, stop)
+            self.start = start
+            self.stop = stop
+            return
+
+        if (start < self.start):
+            start = ephem.Date(min(start, self.start - self.chunk))
+            times = self._sweep(start, self.start)
+            for kind in self.times.keys():
+                self.times[kind] = times[kind] + self.times[kind]
+            self.start = start
+
+        if (stop > self.stop):
+            stop = ephem.Date(max(stop, self.stop + self.chunk))
+            times = self._sweep(self.stop, stop)
+            for kind in self.times.keys():
+                self.times[kind] = self.times[kind] + times[kind]
+            self.stop = stop
+
+    def find(self, date, body, rising, previous, twilight = False):
+        """Return the last transition before (previous is True) or the first
+        after date."""
+        self.cover(date)
+        t = self.times[(body, rising, twilight)]
+        i = bisect.bisect_left(t, ephem.Date(date))
+        if (previous):
+            return t[i - 1]
+        return t[i]
+
+class darkNight:
+    """The dark period of one night at a site. start and stop are UTC
+    datetimes rounded to the second, startLocal and stopLocal the same in
+    local time, and all are None if the night has no dark period. hours is
+    the dark time and isRun marks run nights. At Long Ridge stop and hours
+    are 1 hour less than the dark period (see dark._night)."""
+
+    fields = ("site", "date", "start", "stop", "startLocal", "stopLocal",
+            "hours", "isRun")
+
+    def __init__(self):
+        self.site = None
+        self.date = None
+        self.start = None
+        self.stop = None
+        self.startLocal = None
+        self.stopLocal = None
+        self.hours = 0.
+        self.isRun = False
+
+    def __str__(self):
+        return ("(site: %s, date: %s, start: %s, stop: %s, hours: %.2f, "
+                "isRun: %s)" % (self.site, self.date, self.start, self.stop,
+                    self.hours, self.isRun))
+
+    def __repr__(self):
+        return self.__str__()
+
+class nightWriter:
+    """Writes darkNights one at a time as CSV ("csv"), JSON Lines ("json") or
+    a NumPy structured array ("npy"), so long ranges are never held in
+    memory. CSV and JSON Lines are written to the file path, or to standard
+    output if path is None. The npy file is created at path with room for n
+    nights and filled in as they are written. If append is True, CSV and
+    JSON Lines are added to the end of the file at path, and the CSV header
+    is only written if the file is empty."""
+
+    formats = ("csv", "json", "npy")
+    timeFormat = "%Y-%m-%d %H:%M:%S"
+
+    def __init__(self, fmt, path = None, n = None, append = False):
+        if (fmt not in self.formats):
+            raise ValueError("nightWriter: unknown format (%s)" % fmt)
+        self.fmt = fmt
+        self.path = path
+        self.n = 0
+
+        if (fmt == "npy"):
+            if (path is None or n is None):
+                raise ValueError("nightWriter: npy output needs a path and "
+                        "the number of nights")
+            # NumPy is only needed for this format
+            import numpy as np
+            self._np = np
+            dtype = [("site", "U16"), ("date", "M8[D]"), ("start", "M8[s]"),
+                    ("stop", "M8[s]"), ("startLocal", "M8[s]"),
+                    ("stopLocal", "M8[s]"), ("hours", "f8"), ("isRun", "?")]
+            self.array = np.lib.format.open_memmap(path, mode = "w+",
+                    dtype = dtype, shape = (n,))
+            return
+
+        if (path is None):
+            self.f = sys.stdout
+        elif (append):
+            self.f = open(path, "a")
+        else:
+            self.f = open(path, "w")
+        if (fmt == "csv"):
+            self.csv = csv.writer(self.f, lineterminator = "\n")
+            if (not append or self.f.tell() == 0):
+                self.csv.writerow(darkNight.fields)
+
+    def _time(self, dt):
+        if (dt is None):
+            return None
+        return dt.strftime(self.timeFormat)
+
+    def write(self, night):
+        """Write the darkNight night."""
+        if (self.fmt == "npy"):
+            np = self._np
+            t = []
+            for dt in (night.start, night.stop, night.startLocal,
+                    night.stopLocal):
+                if (dt is None):
+                    t.append(np.datetime64("NaT", "s"))
+                else:
+                    t.append(np.datetime64(dt, "s"))
+            self.array[self.n] = ((night.site, np.datetime64(night.date, "D"))
+                    + tuple(t) + (night.hours, night.isRun))
+        elif (self.fmt == "csv"):
+            row = [night.site, night.date.isoformat()]
+            for dt in (night.start, night.stop, night.startLocal,
+                    night.stopLocal):
+                row.append(self._time(dt) or "")
+            row += ["%.6f" % night.hours, int(night.isRun)]
+            self.csv.writerow(row)
+        else:
+            record = collections.OrderedDict()
+            record["site"] = night.site
+            record["date"] = night.date.isoformat()
+            for k in ("start", "stop", "startLocal", "stopLocal"):
+                record[k] = self._time(getattr(night, k))
+            record["hours"] = round(night.hours, 6)
+            record["isRun"] = night.isRun
+            self.f.write(json.dumps(record) + "\n")
+        self.n += 1
+
+    def close(self):
+        """Finish writing."""
+        if (self.fmt == "npy"):
+            self.array.flush()
+            del self.array
+        elif (self.path is not None):
+            self.f.close()
+        else:
+            self.f.flush()
+
+class runPeriod:
+    def __init__(self):
+        self.start = None
+        self.stop = None
+        self.period = None
+
+class dark:
+    # dark periods are cached in this SQLite file, keyed by site and date.
+    # set cachePath to None to disable the cache.
+    cachePath = os.path.join(os.path.expanduser("~"), ".cache", "tasoft",
+            "dark.sqlite")
+
+    # --run looks for runs within this many days of the date, widening the
+    # window up to maxRunPad days if needed. --year also evaluates this many
+    # days on either side of the year to find the ends of its runs.
+    runPad = 45
+    maxRunPad = 400
+
+    # cached dark periods are discarded when this changes. bump it whenever
+    # the way dark periods are computed changes.
+    cacheVersion = 1
+
+    def __init__(self):
+        # init FD locations here.
+        self.optVerbose = 0
+    
+        self.pname = os.path.basename(sys.argv[0])
+
+        self.site = {}
+        # define the sites
+        self.site["br"] = fdSite("Black Rock Mesa FD", "39.18830",
+                "-112.71170", 1404.)
+        self.site["lr"] = fdSite("Long Ridge FD", "39.20792", "-113.12147",
+                1554.)
+        self.site["md"] = fdSite("Middle Drum FD", "39.47282", "-112.99366",
+                1600.)
+
+        self.startDate = None
+        self.stopDate = None
+
+        self.minDarkTime = 2.75       # hours
+
+        # site (a key of site) whose nights are computed, and whether times
+        # are shown in local time rather than UTC. main sets them from the
+        # command line.
+        self.optSite = "md"
+        self.optLocalTime = False
+
+        # list of strings with run time info for each day.
+        self.darkPeriod = []
+
+        # ephemIndex of each site. dates of a site with an index are looked
+        # up in it rather than searched for one at a time.
+        self.index = {}
+
+        # connection to the dark period cache, opened on first use
+        self._cache = None
+
+        # number of PyEphem searches and computations made without an index
+        self.nCalls = 0
+    
+        # indicates if checking multiple dates. if so report the date as well as
+        # the time when showing runtimes.
+        self.checkMulti = False
+
+    def _siteKey(self, site):
+        """Return a string describing the definition of site. The cached dark
+        periods of a site are discarded when its key changes."""
+        return "%d %s" % (self.cacheVersion, self.site[site].key())
+
+    def _cacheOpen(self):
+        """Return the connection to the dark period cache, or None if the
+        cache is disabled. On first use the cache is created if needed and
+        the dark periods of sites whose definition changed are discarded."""
+        if (self._cache is not None or self.cachePath is None):
+            return self._cache
+
+        try:
+            cacheDir = os.path.dirname(self.cachePath)
+            if (cacheDir):
+                # --all workers may create it at the same time
+                os.makedirs(cacheDir, exist_ok = True)
+            con = sqlite3.connect(self.cachePath)
+            con.execute("CREATE TABLE IF NOT EXISTS sites "
+                    "(site TEXT PRIMARY KEY, key TEXT)")
+            con.execute("CREATE TABLE IF NOT EXISTS dark "
+                    "(site TEXT, date TEXT, start REAL, stop REAL, "
+                    "PRIMARY KEY (site, date))")
+            for k in self.site.keys():
+                key = self._siteKey(k)
+                row = con.execute("SELECT key FROM sites WHERE site = ?",
+                        (k,)).fetchone()
+                if (row is None or row[0] != key):
+                    con.execute("DELETE FROM dark WHERE site = ?", (k,))
+                    con.execute("INSERT OR REPLACE INTO sites VALUES (?, ?)",
+                            (k, key))
+            con.commit()
+        except (OSError, sqlite3.Error) as msg:
+            sys.stderr.write("%s: not using the cache (%s)\n" %
+                    (self.pname, msg))
+            self.cachePath = None
+            return None
+
+        self._cache = con
+        return con
+
+    def _cacheGet(self, date):
+        """Return the cached (start, stop) astroEvents of the dark period of
+        the given date at the current site, or None if it isn't cached."""
+        con = self._cacheOpen()
+        if (con is None):
+            return None
+
+        row = con.execute("SELECT start, stop FROM dark WHERE site = ? AND "
+                "date = ?", (self.optSite, date.strftime("%Y-%m-%d %H:%M:%S"))
+                ).fetchone()
+        if (row is None):
+            return None
+
+        bounds = []
+        for dt in row:
+            a = None
+            if (dt is not None):
+                a = astroEvent()
+                a.title = "Cached"
+                a.dt = dt
+            bounds.append(a)
+        return tuple(bounds)
+
+    def _cachePut(self, date, bounds):
+        """Cache the (start, stop) astroEvents of the dark period of the
+        given date at the current site."""
+        con = self._cacheOpen()
+        if (con is None):
+            return
+
+        row = [None, None]
+        for i in range(2):
+            if (bounds[i] is not None):
+                row[i] = float(bounds[i].dt)
+        con.execute("INSERT OR REPLACE INTO dark VALUES (?, ?, ?, ?)",
+                (self.optSite, date.strftime("%Y-%m-%d %H:%M:%S"), row[0],
+                    row[1]))
+
+    def _cacheCommit(self):
+        """Write the dark periods added to the cache."""
+        if (self._cache is not None):
+            self._cache.commit()
+
+    def close(self):
+        """Write the dark periods added to the cache and close it. The cache
+        is opened again if more nights are computed."""
+        if (self._cache is not None):
+            self._cache.commit()
+            self._cache.close()
+            self._cache = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _findEvents(self, date):
+        """Return a dictionary of the astroEvents in eventDefs for the given
+        date at the current site."""
+        _ephem()
+        obs = self.site[self.optSite].observer()
+        index = self.index.get(self.optSite)
+
+        event = {}
+        for key, title, body, rising, previous, twilight in eventDefs:
+            a = astroEvent()
+            a.title = title
+            if (index is not None):
+                a.dt = index.find(date, body, rising, previous, twilight)
+            else:
+                if (twilight):
+                    obs.horizon = "-18."
+                if (previous and rising):
+                    f = obs.previous_rising
+                elif (previous):
+                    f = obs.previous_setting
+                elif (rising):
+                    f = obs.next_rising
+                else:
+                    f = obs.next_setting
+                a.dt = f(getattr(ephem, body)(), use_center = twilight)
+                self.nCalls += 1
+            event[key] = a
+
+        # note that a side effect of setting use_center is to change the horizon
+        # member value. reset it here for multiple calls for varying dates.
+        obs.horizon = 0.
+
+        return event
+
+    @staticmethod
+    def _scanEvents(event, moonAbove):
+        """Return the astroEvents of the dictionary event (see _findEvents)
+        that start and stop the dark period they bracket, or None for both if
+        there is none. moonAbove is called without arguments if the Moon's
+        state is needed at the end of twilight before any Moon event, and
+        returns True if the Moon is above the horizon at the date."""
+        # events to bracket the run period
+        ev1 = None
+        ev2 = None
+
+        # start states are undefined
+        # we only are interested in the twilight transitions
+        # 1) twilight begins, sun rise
+        # 2) sun set, twilight ends
+        #
+        # nowNight marks the period between twilight end and twilight begin
+        sunUp      = None
+        moonUp     = None
+        nowNight   = None
+        nowDark    = None 
+
+        for l in sorted(event.items(), key=lambda x: x[1].dt):
+            if (l[0].find("moonRise") >= 0):
+                moonUp = True
+            elif (l[0].find("moonSet") >= 0):
+                moonUp = False
+            elif (l[0].find("astroTwilightEnd") >= 0):
+                nowNight = True
+                # check the status of the moon if it's undefined
+                if (moonUp is None):
+                    moonUp = bool(moonAbove())
+            elif (l[0].find("astroTwilightBegin") >= 0):
+                nowNight = False
+            elif (l[0].find("sunRise") >= 0):
+                sunUp = True
+            elif (l[0].find("sunSet") >= 0):
+                sunUp = False
+            else:
+                continue
+
+            if (sunUp or moonUp):
+                nowDark = False
+            if (not sunUp and not moonUp):
+                nowDark = True
+
+            #print "current event: ", l[0]
+            #print "   moonUp", moonUp, "sunUp", sunUp, "nowNight", \
+            #        nowNight, "nowDark", nowDark
+
+            if (nowNight is None or moonUp is None or sunUp is None):
+                continue
+
+            if (not ev1 and nowNight and nowDark):
+                nowDark = True
+                ev1 = l[1]
+                l[1].eventFlag = "+"
+            if (ev1 and (not nowDark or not nowNight)):
+                ev2 = l[1]
+                l[1].eventFlag = "+"
+                break
+
+        return ev1, ev2
+
+    def _findBounds(self, date, verbose = False):
+        """Return the astroEvents that start and stop the dark period of the
+        given date, or None for both if it has no dark period. If verbose is
+        True, print every event."""
+        _ephem()
+        self.site[self.optSite].observer().date = date
+
+        # dictionary of setting/rising events
+        event = self._findEvents(date)
+
+        def moonAbove():
+            moon = ephem.Moon()
+            moon.compute(self.site[self.optSite].observer())
+            self.nCalls += 1
+            return moon.alt > 0.
+
+        ev1, ev2 = self._scanEvents(event, moonAbove)
+
+        if (verbose):
+            for l in sorted(event.items(), key=lambda x: x[1].dt):
+                if (self.optLocalTime):
+                    ldt = localTime(l[1].dt)
+                    print("%30s  %s" %
+                            (l[1].title, ldt.strftime("%Y-%m-%d %T")),
+                            end = " ")
+                    # flag the events that demarcate dark time
+                    if (l[1].eventFlag is not None):
+                        print("  %s" % (l[1].eventFlag))
+                    else:
+                        print("")
+                else:
+                    print("%30s  %s" %
+                            (l[1].title,
+                                utcTime(l[1].dt).strftime("%Y-%m-%d %T")),
+                            end = " ")
+                    # flag the events that demarcate dark time
+                    if (l[1].eventFlag is not None):
+                        print("  %s" % (l[1].eventFlag))
+                    else:
+                        print("")
+
+        return ev1, ev2
+
+    @staticmethod
+    def _roundSecond(dt):
+        """Return the datetime dt rounded to the second."""
+        discard = datetime.timedelta(microseconds = dt.microsecond)
+        dt -= discard
+        if (discard >= datetime.timedelta(microseconds = 500)):
+                dt += datetime.timedelta(seconds = 1)
+        return dt
+
+    def _night(self, date, allowVerb = True):
+        """ Find dark period for given date. if allowVerb is True, allow verbose
+        output. Set allowVerb to False when checking if a date is a run date for
+        example and don't want to clutter the user screen with excess
+        garbage. Return the darkNight of the date."""
+        verbose = allowVerb and self.optVerbose
+        if (verbose):
+            print("date: ", date.date())
+
+        # the events that bracket the dark period. the cache only keeps their
+        # times, so they are always computed for verbose output.
+        bounds = None
+        if (not verbose):
+            bounds = self._cacheGet(date)
+        if (bounds is None):
+            bounds = self._findBounds(date, verbose)
+            self._cachePut(date, bounds)
+        ev1, ev2 = bounds
+
+        night = darkNight()
+        night.site = self.optSite
+        night.date = date.date()
+        if (ev1 and ev2):
+            # round times to the nearest second
+            night.start = self._roundSecond(utcTime(ev1.dt))
+            night.stop = self._roundSecond(utcTime(ev2.dt))
+            night.startLocal = self._roundSecond(localTime(ev1.dt))
+            night.stopLocal = self._roundSecond(localTime(ev2.dt))
+
+            # taking the difference makes this a timedelta. convert to hours.
+            night.hours = (night.stop - night.start).total_seconds()/3600.
+            night.isRun = night.hours > self.minDarkTime
+
+            # Long Ridge dark times are 1 hour shorter than other FDs, but
+            # this 1 hour difference does not influence whether it is a run
+            # night or not.
+            if (self.optSite == "lr"):
+                night.stop -= datetime.timedelta(hours = 1)
+                night.stopLocal -= datetime.timedelta(hours = 1)
+                night.hours -= 1.
+                if (night.hours < 0.):
+                    night.hours = 0.
+
+        return night
+
+    def _format(self, night):
+        """Return the line describing the dark period of the darkNight night,
+        or None if it has none."""
+        if (night.start is None):
+            return None
+
+        if (self.optLocalTime):
+            startTime = night.startLocal
+            stopTime = night.stopLocal
+        else:
+            startTime = night.start
+            stopTime = night.stop
+
+        darkMark = " "
+        if (night.isRun):
+            darkMark = "*"
+
+        # if checking more than 1 day print out the date along with the run
+        # time information
+        if (self.checkMulti):
+            s = (("%s start: %s %02d:%02d:%02d   stop: %s %02d:%02d:%02d" +
+                " (%5.2f)") %
+                (darkMark, startTime.date(), startTime.time().hour,
+                    startTime.time().minute,
+                    startTime.time().second, stopTime.date(),
+                    stopTime.time().hour, stopTime.time().minute,
+                    stopTime.time().second,
+                    night.hours))
+        else:
+            s = (("%s start: %02d:%02d:%02d   stop: %02d:%02d:%02d" +
+                " (%5.2f)") %
+                (darkMark, startTime.time().hour,
+                    startTime.time().minute,
+                    startTime.time().second,
+                    stopTime.time().hour, stopTime.time().minute,
+                    stopTime.time().second,
+                    night.hours))
+
+        return s
+
+    def _findDarkPeriod(self, date, allowVerb = True):
+        """ Find dark period for given date and add it to darkPeriod. See
+        _night for allowVerb. Return True if date is a run date, otherwise
+        return False."""
+        night = self._night(date, allowVerb)
+        s = self._format(night)
+        if (s is not None):
+            self.darkPeriod.append(s)
+        return night.isRun
+
+    def nights(self, start, stop = None, site = None):
+        """Generate the darkNight of each night from the date start up to, but
+        not including, stop (the night of start only if stop is None) at the
+        given site (the current site if None). Nights are computed as they
+        are requested, so long ranges can be written out as they go. The
+        dark periods added to the cache are written when the generator is
+        done; close() also releases the cache."""
+        if (site is not None):
+            self.optSite = site
+        n = 1
+        if (stop is not None):
+            n = max(1, (stop - start).days)
+        if (n > 1 and self.optSite not in self.index):
+            self.index[self.optSite] = ephemIndex(self.site[self.optSite],
+                    start, stop)
+
+        try:
+            for i in range(n):
+                yield self._night(start + datetime.timedelta(days = i), False)
+        finally:
+            self._cacheCommit()
+
+    def _nights(self, start, n):
+        """Return a list of the darkNights of the n consecutive nights from the
+        date start."""
+        nights = []
+        for i in range(n):
+            nights.append(self._night(start + datetime.timedelta(days = i),
+                False))
+        return nights
+
+    @staticmethod
+    def _segments(flags):
+        """Return the (first, last) indices of each stretch of consecutive
+        True values in the list flags."""
+        segments = []
+        first = None
+        for i, f in enumerate(flags):
+            if (f and first is None):
+                first = i
+            elif (not f and first is not None):
+                segments.append((first, i - 1))
+                first = None
+        if (first is not None):
+            segments.append((first, len(flags) - 1))
+        return segments
+
+    def _findRun(self, date):
+        """Return the darkNights of the run that includes the date
+        or, if the date is not a run night, of the run that begins closest to
+        it. Return an empty list if no run is found within maxRunPad days.
+
+        The nights within runPad days of the date are evaluated once and split
+        into runs. The window is widened if it cuts off a run that is needed
+        to decide."""
+        pad = self.runPad
+        while (pad <= self.maxRunPad):
+            nights = self._nights(date - datetime.timedelta(days = pad),
+                    2*pad + 1)
+            last = 2*pad
+            runs = self._segments([night.isRun for night in nights])
+
+            run = None
+            for r in runs:
+                if (r[0] <= pad <= r[1]):
+                    run = r
+            if (run is None):
+                prev = [r for r in runs if r[1] < pad]
+                next = [r for r in runs if r[0] > pad]
+                if (prev and next and prev[-1][0] > 0):
+                    if (pad - prev[-1][0] < next[0][0] - pad):
+                        run = prev[-1]
+                    else:
+                        run = next[0]
+
+            if (run is not None and run[0] > 0 and run[1] < last):
+                return nights[run[0]:run[1] + 1]
+            pad *= 2
+
+        return []
+
+    def _findRuns(self, start, stop):
+        """Return the darkNights of each run that begins from the date start
+        up to, but not including, stop."""
+        pad = datetime.timedelta(days = self.runPad)
+        n = (stop - start).days
+        nights = self._nights(start - pad, n + 2*pad.days)
+        runs = []
+        for first, last in self._segments([night.isRun for night in nights]):
+            # runs cut off by the ends of the window are incomplete
+            if (first == 0 or last == len(nights) - 1):
+                continue
+            if (start.date() <= nights[first].date < stop.date()):
+                runs.append(nights[first:last + 1])
+        return runs
+
+    def usage(self):
+        print("usage: %s [OPTION]" % os.path.basename(sys.argv[0]))
+        print("  -a --all\tPrint dark times for every defined site, " +
+                "computed in parallel.")
+        print("  -d --date\tPrint dark times for a given date. Provide " +
+                "date in YYYY-MM-DD")
+        print("\t\tformat. Follow with another -d to specify a range.")
+        print("  -f --format\tOutput format: text (default), or one record " +
+                "per night as")
+        print("\t\tcsv, json (JSON Lines) or npy (NumPy structured array, " +
+                "needs")
+        print("\t\t--output).")
+        print("  -h --help\tPrint this message and exit.")
+        print("  -l --local\tShow all times for local time zone.")
+        print(("  -m --minDark\tSet minimum number of hours for a " +
+                "run night (Default: %5.2f)") % (self.minDarkTime))
+        print("  --no-cache\tDon't read or write the cache of dark periods")
+        print("\t\t(%s)." % (self.cachePath))
+        print("  -o --output\tWrite to the given file instead of standard " +
+                "output.")
+        print("  -r --run\tPrint out information for an entire FD run")
+        print("  -s --site\tPrint dark times for a given site. Acceptable " +
+                "sites are:")
+        print("\t\t", end = "")
+        for k in sorted(self.site.keys()):
+            print("\"%s\"" % (k), end = " ")
+        print("")
+        print("  --br\tPrint dark times for Black Rock.")
+        print("  --lr\tPrint dark times for Long Ridge. (NOTE: dark times " +
+                "for Long Ridge are\n\t1 hour shorter than other FDs.)")
+        print("  --md\tPrint dark times for Middle Drum.")
+        print("  -v --verbose\tIncrease output verbosity level.")
+        print("  -y --year\tList every FD run that begins in the given year " +
+                "(YYYY).")
+        print("")
+        print("Defined sites:")
+        for k in sorted(self.site.keys()):
+            print("%s   \t[%s %s]" % (self.site[k].name, self.site[k].lat,
+                self.site[k].long))
+
+
+    def main(self, argv = None):
+        errorFlag = False
+
+        if (argv is None):
+            argv = sys.argv
+
+        cOpts = []
+        cArgs = []
+
+        try:
+            cOpts, cArgs = getopt.gnu_getopt(argv[1:],
+                    "ad:f:hlm:o:rs:vy:",
+                    ["all",
+                     "br",
+                     "date=",
+                     "format=",
+                     "help",
+                     "local",
+                     "lr",
+                     "md",
+                     "minDark",
+                     "no-cache",
+                     "output=",
+                     "run",
+                     "site=",
+                     "verbose",
+                     "year="])
+        except getopt.GetoptError as msg:
+            print("%s: %s" % (self.pname, msg), file = sys.stderr)
+            errorFlag = True
+
+        optDate = None
+        self.optLocalTime = False
+        optRun = False
+        optYear = None
+        optAll = False
+        optFormat = "text"
+        optOutput = None
+        self.optSite = "md"
+        for (opt, arg) in cOpts:
+            if (opt in ("-a", "--all")):
+                optAll = True
+                self.checkMulti = True
+            elif (opt == "--br"):
+                self.optSite = "br"
+            elif (opt in ("-d", "--date")):
+                try:
+                    optDate = datetime.datetime.strptime(arg, "%Y-%m-%d")
+                except ValueError:
+                    print("%s: Invalid date" % self.pname, file = sys.stderr)
+                    return 1
+                optDate = datetime.datetime.combine(optDate,
+                        datetime.time(23, 59, 0))
+                if (self.startDate is None):
+                    self.startDate = optDate
+                elif (self.stopDate is None):
+                    self.stopDate = optDate
+                    self.checkMulti = True
+                else:
+                    print("%s: Invalid range" % self.pname, file = sys.stderr)
+                    errorFlag = True
+            elif (opt in ("-f", "--format")):
+                optFormat = arg
+                if (optFormat not in ("text",) + nightWriter.formats):
+                    print("%s: Invalid format (%s)" %
+                            (self.pname, arg), file = sys.stderr)
+                    errorFlag = True
+            elif (opt in ("-h", "--help")):
+                self.usage()
+                return 0
+            elif (opt in ("-l", "--local")):
+                self.optLocalTime = True
+            elif (opt == "--lr"):
+                self.optSite = "lr"
+            elif (opt == "--md"):
+                self.optSite = "md"
+            elif (opt == "--no-cache"):
+                self.cachePath = None
+            elif (opt in ("-o", "--output")):
+                optOutput = arg
+            elif (opt in ("-m", "--minDark")):
+                try:
+                    mdt = float(arg)
+                except ValueError:
+                    print("%s: Invalid minimum dark time (%s)" %
+                            (self.pname, arg), file = sys.stderr)
+                    errorFlag = True
+                    break
+                if (mdt < 0. or mdt > 24.):
+                    print("%s: Invalid minimum dark time (%s)" %
+                                    (self.pname, arg), file = sys.stderr)
+                    errorFlag = True
+                self.minDarkTime = mdt
+            elif (opt in ("-r", "--run")):
+                optRun = True
+                self.checkMulti = True
+            elif (opt in ("-s", "--site")):
+                self.optSite = arg
+                if (self.optSite not in self.site.keys()):
+                    errorFlag = True
+                    print("%s: Invalid site (%s)" %
+                            (self.pname, self.optSite), file = sys.stderr)
+            elif (opt in ("-v", "--verbose")):
+                self.optVerbose += 1
+            elif (opt in ("-y", "--year")):
+                try:
+                    optYear = int(arg)
+                except ValueError:
+                    optYear = 0
+                if (optYear < 1 or optYear > 9998):
+                    print("%s: Invalid year (%s)" %
+                            (self.pname, arg), file = sys.stderr)
+                    errorFlag = True
+                self.checkMulti = True
+
+
+        if (errorFlag):
+            self.usage()
+            return 1
+        
+        # if user didn't specify a date or date range use today's date
+        if (self.startDate is None):
+            dtUTCNow = datetime.datetime.utcnow()
+            dtUTCDate = dtUTCNow.date()
+            # set the time to 23:59 UTC
+            dtUTCTime = datetime.time(23, 59, 0)
+
+            dtNow = datetime.datetime.combine(dtUTCDate, dtUTCTime)
+
+            #self.site[self.optSite].date = dtNow
+            self.startDate = dtNow
+
+        # if date range is provided ignore --run option
+        if (self.stopDate):
+            optRun = False
+
+        if (optFormat == "npy" and optOutput is None):
+            print("%s: --format npy needs --output" %
+                    self.pname, file = sys.stderr)
+            self.usage()
+            return 1
+
+        if (optAll and (optRun or optYear is not None)):
+            print("%s: --all can't be combined with --run or "
+                    "--year" % self.pname, file = sys.stderr)
+            self.usage()
+            return 1
+
+        # neighboring dates share most of their transitions, so look dates
+        # up in an index of them when checking more than one
+        pad = datetime.timedelta(days = self.runPad)
+        if (optYear is not None):
+            # runs that begin in the given year
+            start = datetime.datetime(optYear, 1, 1, 23, 59, 0)
+            stop = datetime.datetime(optYear + 1, 1, 1, 23, 59, 0)
+            self.index[self.optSite] = ephemIndex(self.site[self.optSite],
+                    start - pad, stop + pad)
+        elif (optRun):
+            self.index[self.optSite] = ephemIndex(self.site[self.optSite],
+                    self.startDate - pad, self.startDate + pad)
+        elif (self.stopDate):
+            self.index[self.optSite] = ephemIndex(self.site[self.optSite],
+                    self.startDate, self.stopDate)
+
+        # the darkNights to write when a structured format is chosen, and
+        # their number
+        records = []
+        n = 0
+        self.darkPeriod = []
+        if (optAll):
+            # PyEphem is CPU bound, so the sites are computed in parallel
+            stopDate = self.stopDate or self.startDate
+            sites = sorted(self.site.keys())
+            tasks = [(k, self.startDate, stopDate, self.minDarkTime,
+                self.cachePath) for k in sites]
+            pool = multiprocessing.Pool(len(sites))
+            try:
+                siteNights = pool.map(_siteNights, tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+            # one line per site and night, ordered by night
+            for i in range(len(siteNights[0])):
+                for nights in siteNights:
+                    records.append(nights[i])
+                    dp = self._format(nights[i])
+                    if (dp is not None):
+                        self.darkPeriod.append("%s %s" % (nights[i].site, dp))
+
+        elif (optYear is not None):
+            for run in self._findRuns(start, stop):
+                records.extend(run)
+                self.darkPeriod.append(("%s - %s  nights: %2d  hours: %6.2f" %
+                    (run[0].date, run[-1].date, len(run),
+                        sum([night.hours for night in run]))))
+
+        elif (optRun):
+            records = self._findRun(self.startDate)
+            for night in records:
+                if (self.optVerbose and optFormat == "text"):
+                    self._findDarkPeriod(datetime.datetime.combine(night.date,
+                        self.startDate.time()))
+                else:
+                    self.darkPeriod.append(self._format(night))
+
+        elif (optFormat != "text"):
+            # nights are written out as they are computed
+            records = self.nights(self.startDate, self.stopDate)
+            if (self.stopDate is not None):
+                n = max(1, (self.stopDate - self.startDate).days)
+
+        else:
+            date = self.startDate
+            if (self.stopDate is None):
+                self.stopDate = self.startDate
+            while (True):
+                self._findDarkPeriod(date)
+                date = date + datetime.timedelta(days = 1)
+                td = self.stopDate - date
+                if (td.days <= 0.):
+                    break
+
+        if (optFormat == "text"):
+            self.close()
+            if (len(self.darkPeriod)):
+                if (optOutput is not None):
+                    f = open(optOutput, "w")
+                else:
+                    f = sys.stdout
+                for dp in self.darkPeriod:
+                    f.write(dp + "\n")
+                if (optOutput is not None):
+                    f.close()
+                #if (self.checkMulti):
+                #    print("%d run days" % len(self.darkPeriod))
+            return 0
+
+        if (isinstance(records, list)):
+            n = len(records)
+        writer = nightWriter(optFormat, optOutput, max(n, 1))
+        for night in records:
+            writer.write(night)
+        writer.close()
+        self.close()
+
+        return 0
+
+def _siteNights(args):
+    """Return the darkNight of each night from start up to, but not
+    including, stop at the given site. Run in a worker process for each site
+    by dark.main with --all."""
+    site, start, stop, minDarkTime, cachePath = args
+
+    d = dark()
+    d.optSite = site
+    d.minDarkTime = minDarkTime
+    d.cachePath = cachePath
+    d.checkMulti = True
+    d.index[site] = ephemIndex(d.site[site], start, stop)
+
+    nights = d._nights(start, max(1, (stop - start).days))
+    d.close()
+
+    return nights
+
+def main(argv = None):
+    """Run the command line interface with the arguments argv (sys.argv if
+    None) and return the exit status."""
+    return dark().main(argv)
+
+if (__name__ == "__main__"):
+    sys.exit(main())
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Keep a run calendar of the dark periods of a fluorescence detector site.
+
+The calendar is a CSV file of one darkNight per night, as written by
+dark.nightWriter. Updating it to cover a range of nights only computes the
+nights that are missing from it: nights after its end are appended to the
+file, and the file is only rewritten if nights are added before or within
+it. The key of the site definition and minDarkTime used is kept in a file
+next to the calendar (path + ".key"); when it changes every night is
+computed again, which the dark cache keeps cheap unless the site itself
+changed. Runs are summarized from the calendar one night at a time, so
+neither the calendar nor the output is ever held in memory.
+"""
+
+__author__  = "William Hanlon"
+__email__   = "whanlon@cosmic.utah.edu"
+__version__ = "1.0.0."
+
+import csv
+import datetime
+import getopt
+import os
+import sys
+
+import dark
+
+def readNight(row):
+    """Return the darkNight of a row (a dictionary) of a CSV file written by
+    dark.nightWriter."""
+    night = dark.darkNight()
+    night.site = row["site"]
+    night.date = datetime.datetime.strptime(row["date"], "%Y-%m-%d").date()
+    for k in ("start", "stop", "startLocal", "stopLocal"):
+        if (row[k]):
+            setattr(night, k, datetime.datetime.strptime(row[k],
+                dark.nightWriter.timeFormat))
+    night.hours = float(row["hours"])
+    night.isRun = bool(int(row["isRun"]))
+    return night
+
+class runCalendar:
+    """Calendar of the darkNights of a site (a key of dark.site) computed by
+    the dark object d, kept in the CSV file at path."""
+
+    # time (UTC) of the dates whose dark periods are computed, as dark.main
+    time = datetime.time(23, 59, 0)
+
+    def __init__(self, path, d, site):
+        self.path = path
+        self.dark = d
+        self.site = site
+
+        # number of nights computed and kept by the last update
+        self.nComputed = 0
+        self.nKept = 0
+
+    def _key(self):
+        """Return a string describing how the calendar's nights are
+        computed."""
+        return "%s %r" % (self.dark._siteKey(self.site), self.dark.minDarkTime)
+
+    def _keyPath(self):
+        return self.path + ".key"
+
+    def _valid(self):
+        """Return True if the calendar's nights were computed as they would
+        be now."""
+        try:
+            with open(self._keyPath()) as f:
+                return f.read().strip() == self._key()
+        except OSError:
+            return False
+
+    def nights(self):
+        """Generate the darkNights of the calendar in order."""
+        if (not os.path.isfile(self.path)):
+            return
+        with open(self.path, newline = "") as f:
+            for row in csv.DictReader(f):
+                yield readNight(row)
+
+    def _extent(self):
+        """Return the first and last dates of the calendar and whether every
+        night between them is in it, or None for both dates if it is
+        empty."""
+        first = None
+        last = None
+        whole = True
+        for night in self.nights():
+            if (first is None):
+                first = night.date
+            elif (night.date != last + datetime.timedelta(days = 1)):
+                whole = False
+            last = night.date
+        return first, last, whole
+
+    def _compute(self, start, stop):
+        """Generate the darkNights of the dates from start up to, but not
+        including, stop."""
+        start = datetime.datetime.combine(start, self.time)
+        stop = datetime.datetime.combine(stop, self.time)
+        self.dark.index.pop(self.site, None)
+        for night in self.dark.nights(start, stop, self.site):
+            self.nComputed += 1
+            yield night
+
+    def update(self, start, stop):
+        """Make the calendar cover the nights from the date start up to, but
+        not including, stop, computing only the nights it is missing."""
+        self.nComputed = 0
+        self.nKept = 0
+        valid = self._valid()
+        first, last, whole = self._extent()
+        if (first is not None):
+            start = min(start, first)
+            stop = max(stop, last + datetime.timedelta(days = 1))
+
+        if (first is not None and valid and whole and start == first):
+            # only nights after the end of the calendar are missing
+            self.nKept = (last - first).days + 1
+            new = last + datetime.timedelta(days = 1)
+            if (new < stop):
+                writer = dark.nightWriter("csv", self.path, append = True)
+                for night in self._compute(new, stop):
+                    writer.write(night)
+                writer.close()
+        else:
+            # keep the nights of a valid calendar, compute the others and
+            # replace the file
+            tmp = self.path + ".tmp"
+            writer = dark.nightWriter("csv", tmp)
+            kept = iter(self.nights() if valid else ())
+            night = next(kept, None)
+            date = start
+            while (date < stop):
+                while (night is not None and night.date < date):
+                    night = next(kept, None)
+                if (night is not None and night.date == date):
+                    writer.write(night)
+                    self.nKept += 1
+                    date += datetime.timedelta(days = 1)
+                    continue
+                # compute up to the next night that is kept
+                end = stop
+                if (night is not None):
+                    end = min(stop, night.date)
+                for computed in self._compute(date, end):
+                    writer.write(computed)
+                date = end
+            writer.close()
+            os.replace(tmp, self.path)
+
+        self.dark.close()
+        with open(self._keyPath(), "w") as f:
+            f.write(self._key() + "\n")
+
+    def runs(self):
+        """Generate the first and last dates, number of nights and dark hours
+        of each run in the calendar, and whether it is complete (runs at the
+        ends of the calendar may go on beyond it)."""
+        run = []
+        atStart = True
+        for night in self.nights():
+            if (night.isRun):
+                run.append(night)
+                continue
+            if (run):
+                yield self._summary(run, not atStart)
+                run = []
+            atStart = False
+        if (run):
+            yield self._summary(run, False)
+
+    @staticmethod
+    def _summary(run, complete):
+        return (run[0].date, run[-1].date, len(run),
+                sum([night.hours for night in run]), complete)
+
+def usage():
+    print("usage: %s [OPTION] CALENDAR" % os.path.basename(sys.argv[0]))
+    print("  -d --date\tFirst night to add (YYYY-MM-DD). Follow with " +
+            "another -d to give")
+    print("\t\tthe end of the range (exclusive).")
+    print("  -e --extend\tAdd the given number of nights after the end of " +
+            "the calendar.")
+    print("  -h --help\tPrint this message and exit.")
+    print("  -m --minDark\tSet minimum number of hours for a run night " +
+            "(Default: 2.75).")
+    print("  --no-cache\tDon't read or write the cache of dark periods.")
+    print("  -r --runs\tPrint a summary of every run in the calendar.")
+    print("  -s --site\tSite of the calendar (Default: md).")
+
+def main(argv = None):
+    """Update the run calendar given on the command line and summarize its
+    runs."""
+    if (argv is None):
+        argv = sys.argv
+    pname = os.path.basename(argv[0])
+
+    try:
+        cOpts, cArgs = getopt.gnu_getopt(argv[1:], "d:e:hm:rs:",
+                ["date=", "extend=", "help", "minDark=", "no-cache", "runs",
+                    "site="])
+    except getopt.GetoptError as msg:
+        print("%s: %s" % (pname, msg), file = sys.stderr)
+        usage()
+        return 1
+
+    d = dark.dark()
+    site = "md"
+    dates = []
+    extend = 0
+    optRuns = False
+    for (opt, arg) in cOpts:
+        try:
+            if (opt in ("-d", "--date")):
+                dates.append(datetime.datetime.strptime(arg,
+                    "%Y-%m-%d").date())
+            elif (opt in ("-e", "--extend")):
+                extend = int(arg)
+            elif (opt in ("-h", "--help")):
+                usage()
+                return 0
+            elif (opt in ("-m", "--minDark")):
+                d.minDarkTime = float(arg)
+            elif (opt == "--no-cache"):
+                d.cachePath = None
+            elif (opt in ("-r", "--runs")):
+                optRuns = True
+            elif (opt in ("-s", "--site")):
+                if (arg not in d.site):
+                    raise ValueError("invalid site")
+                site = arg
+        except ValueError:
+            print("%s: Invalid value for %s (%s)" % (pname, opt, arg),
+                    file = sys.stderr)
+            return 1
+
+    if (len(cArgs) != 1 or len(dates) > 2):
+        usage()
+        return 1
+
+    cal = runCalendar(cArgs[0], d, site)
+    if (len(dates) == 1):
+        dates.append(dates[0] + datetime.timedelta(days = 1))
+    if (extend > 0):
+        first, last, whole = cal._extent()
+        if (last is None and not dates):
+            print("%s: --extend needs a calendar or a date" % pname,
+                    file = sys.stderr)
+            return 1
+        if (last is None):
+            last = dates[0] - datetime.timedelta(days = 1)
+        end = last + datetime.timedelta(days = extend + 1)
+        if (dates):
+            dates[1] = max(dates[1], end)
+        else:
+            dates = [last + datetime.timedelta(days = 1), end]
+
+    if (not dates and os.path.isfile(cal.path) and not cal._valid()):
+        # the calendar was computed differently, so it is computed again
+        first, last, whole = cal._extent()
+        if (first is not None):
+            dates = [first, first]
+
+    if (dates):
+        cal.update(dates[0], dates[1])
+        print("%s: %d nights computed, %d kept" % (cArgs[0], cal.nComputed,
+            cal.nKept), file = sys.stderr)
+
+    if (optRuns):
+        for first, last, n, hours, complete in cal.runs():
+            print("%s - %s  nights: %2d  hours: %6.2f%s" % (first, last, n,
+                hours, "" if complete else "  (partial)"))
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
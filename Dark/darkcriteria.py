@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Evaluate configurable dark time criteria over long ranges of nights.
+
+dark counts a night as dark while the center of the Sun is below -18
+degrees and the Moon is below the horizon. A darkCriteria sets the Sun
+depression and the Moon altitude limit, and can also accept a Moon of at
+most a given illumination fraction up to a higher altitude, as for a thin
+crescent low in the sky. Subclasses can replace the test altogether.
+
+Criteria are evaluated on a nightTable: the Sun and Moon altitudes and the
+Moon illumination of every night on a grid (see darkgrid.altitudeGrid),
+kept one row per night. The table of a site and range of nights is
+computed once and cached in a NumPy file next to the dark cache, so
+evaluating another setting over ten years is a few array operations rather
+than a new ephemeris run. Dark periods are found to the grid step.
+"""
+
+__author__  = "William Hanlon"
+__email__   = "whanlon@cosmic.utah.edu"
+__version__ = "1.0.0."
+
+import datetime
+import getopt
+import itertools
+import os
+import sys
+
+import numpy as np
+
+import dark
+import darkgrid
+
+def apparentAltitude(h):
+    """Return the apparent altitudes (degrees) of the true altitudes h.
+
+    The refraction falls from about 0.6 degrees at the horizon to 0.1
+    degrees at 10 degrees. It is darkgrid.refraction scaled so that the
+    apparent altitude is 0 where PyEphem puts the horizon, at a true
+    altitude of -darkgrid.horizonRefraction, as dark's rising and setting
+    times do."""
+    scale = darkgrid.horizonRefraction/darkgrid.refraction(
+            -darkgrid.horizonRefraction)
+    return h + scale*darkgrid.refraction(h)
+
+class nightTable:
+    """Sun and Moon data of the n nights from the date start at a site (a
+    key of dark.site) every step seconds, one row per night.
+
+    The night of a date is the 24 hours from local mean noon of the day
+    before, so it holds the evening twilight that ends on that date (UTC)
+    as the nights of dark do at the Telescope Array sites. sunAlt is the
+    altitude of the Sun's center, moonAlt the apparent altitude of the
+    Moon's upper limb (see apparentAltitude; above 0 while dark counts the
+    Moon as up) and moonIllum its illuminated fraction. jd holds the Julian date of the
+    first point of each night."""
+
+    # table files are kept in this directory, the dark cache's if None.
+    # set cacheDir to False to disable the cache.
+    cacheDir = None
+
+    # cached tables are recomputed when this changes. bump it whenever the
+    # way the table is computed changes.
+    cacheVersion = 3
+
+    def __init__(self, d, site, start, n, step = 60.):
+        # d is a dark object
+        if (86400 % step):
+            raise ValueError("nightTable: step must divide a day (%r)" %
+                    step)
+        self.site = site
+        self.date = start.date()
+        self.n = n
+        self.step = float(step)
+        self.m = int(86400//step)
+
+        path = self._path(d)
+        if (path is not None and os.path.isfile(path)):
+            with np.load(path) as f:
+                if (str(f["key"]) == self._key(d)):
+                    self._set(f)
+                    return
+
+        first = datetime.datetime.combine(self.date, datetime.time())
+        first -= datetime.timedelta(days = 0.5 +
+                float(d.site[site].long)/360.)
+        grid = darkgrid.altitudeGrid(d.site[site], first, first +
+                datetime.timedelta(days = n, seconds = -self.step), self.step)
+        arrays = {"jd": grid.jd[::self.m],
+                "sunAlt": grid.sunAlt.astype(np.float32),
+                "moonAlt": apparentAltitude(grid.moonAlt +
+                    grid.moonSD).astype(np.float32),
+                "moonIllum": grid.moonIllum.astype(np.float32)}
+        self._set(arrays)
+
+        if (path is not None):
+            try:
+                np.savez(path, key = self._key(d), **arrays)
+            except OSError as msg:
+                sys.stderr.write("%s: not caching the night table (%s)\n" %
+                        (d.pname, msg))
+
+    def _key(self, d):
+        """Return a string describing the definition of the table."""
+        return "%d %s %s %d %r" % (self.cacheVersion, d.site[self.site].key(),
+                self.date, self.n, self.step)
+
+    def _path(self, d):
+        """Return the path of the table's cache file, or None if tables
+        aren't cached."""
+        cacheDir = self.cacheDir
+        if (cacheDir is None and d.cachePath is not None):
+            cacheDir = os.path.dirname(d.cachePath)
+        if (not cacheDir):
+            return None
+        try:
+            os.makedirs(cacheDir, exist_ok = True)
+        except OSError:
+            return None
+        return os.path.join(cacheDir, "nights-%s-%s-%d-%d.npz" %
+                (self.site, self.date, self.n, self.step))
+
+    def _set(self, arrays):
+        self.jd = np.array(arrays["jd"])
+        for k in ("sunAlt", "moonAlt", "moonIllum"):
+            setattr(self, k, np.array(arrays[k]).reshape(self.n, self.m))
+
+class darkCriteria:
+    """Decides when the sky is dark enough to run.
+
+    It is dark while the center of the Sun is more than sunDepression
+    degrees below the horizon and the Moon's upper limb is below
+    moonAltitude degrees, or below crescentAltitude degrees if its
+    illumination fraction is at most moonIllumination. The defaults are
+    the criteria of dark. Subclasses may override isDark."""
+
+    def __init__(self, sunDepression = 18., moonAltitude = 0.,
+            moonIllumination = 0., crescentAltitude = 0.):
+        self.sunDepression = sunDepression
+        self.moonAltitude = moonAltitude
+        self.moonIllumination = moonIllumination
+        self.crescentAltitude = crescentAltitude
+
+    def __str__(self):
+        return ("sun < -%g, moon < %g or < %g at illumination <= %g" %
+                (self.sunDepression, self.moonAltitude, self.crescentAltitude,
+                    self.moonIllumination))
+
+    def isDark(self, table):
+        """Return a boolean array of the points of the nightTable table when
+        it is dark."""
+        moonDown = table.moonAlt < self.moonAltitude
+        if (self.moonIllumination > 0.):
+            moonDown |= ((table.moonIllum <= self.moonIllumination) &
+                    (table.moonAlt < self.crescentAltitude))
+        return (table.sunAlt < -self.sunDepression) & moonDown
+
+    def evaluate(self, table):
+        """Return the longest dark period of each night of the nightTable
+        table (the earliest of equally long ones) as arrays of the indices
+        of its first and last points (-1 if the night has none), and the
+        total dark hours of each night. Looser criteria only lengthen the
+        longest period, so run counts are monotone in the thresholds."""
+        mask = self.isDark(table)
+        total = mask.sum(axis = 1)*table.step/3600.
+
+        padded = np.zeros((table.n, table.m + 2), dtype = np.int8)
+        padded[:, 1:-1] = mask
+        edge = np.diff(padded, axis = 1)
+        # periods in row order, each row's periods in time order
+        row, start = np.nonzero(edge == 1)
+        stop = np.nonzero(edge == -1)[1]
+        order = np.lexsort((start, start - stop, row))
+        best = order[np.diff(row[order], prepend = -1) != 0]
+
+        first = np.full(table.n, -1)
+        last = np.full(table.n, -1)
+        first[row[best]] = start[best]
+        last[row[best]] = stop[best] - 1
+        return first, last, total
+
+    def nights(self, d, table):
+        """Return the darkNight of each night of the nightTable table, with
+        the longest dark period of the night and the minDarkTime and Long
+        Ridge adjustment of the dark object d. Unlike dark, a night that
+        has no darkness of its own doesn't report the following night's."""
+        first, last, total = self.evaluate(table)
+        engine = darkgrid.gridEngine(d)
+
+        nights = []
+        for k in range(table.n):
+            night = dark.darkNight()
+            night.site = table.site
+            night.date = table.date + datetime.timedelta(days = k)
+            if (first[k] >= 0):
+                jd = table.jd[k] + np.array([first[k], last[k] + 1])*(
+                        table.step/86400.)
+                engine._fill(night, *darkgrid.ephemDate(jd),
+                        site = table.site)
+            nights.append(night)
+        return nights
+
+def summary(criteria, table, minDarkTime):
+    """Return the number of nights of the nightTable table with a dark
+    period, the number of run nights (a longest dark period longer than
+    minDarkTime hours) and the total dark hours, under criteria."""
+    first, last, total = criteria.evaluate(table)
+    hours = np.where(first >= 0, last - first + 1, 0)*table.step/3600.
+    return (int(np.count_nonzero(first >= 0)),
+            int(np.count_nonzero(hours > minDarkTime)), float(total.sum()))
+
+def usage():
+    print("usage: %s [OPTION]" % os.path.basename(sys.argv[0]))
+    print("  -d --date\tFirst night (YYYY-MM-DD). Follow with another -d to " +
+            "give the")
+    print("\t\tend of the range (Default: one year).")
+    print("  -h --help\tPrint this message and exit.")
+    print("  -i --illum\tMoon illumination fraction allowed up to " +
+            "--crescent (Default: 0).")
+    print("  -c --crescent\tMoon altitude limit (degrees) of such a Moon " +
+            "(Default: 0).")
+    print("  -a --moon\tMoon altitude limit (degrees) (Default: 0).")
+    print("  -m --minDark\tMinimum number of hours for a run night " +
+            "(Default: 2.75).")
+    print("  -s --site\tSite (Default: md).")
+    print("  -u --sun\tSun depression (degrees) (Default: 18).")
+    print("  -t --step\tGrid step in seconds (Default: 60).")
+    print("")
+    print("Thresholds take comma separated lists of values, and a summary " +
+            "is printed")
+    print("for every combination.")
+
+def main(argv = None):
+    """Print the dark time of a range of nights under each combination of
+    thresholds."""
+    if (argv is None):
+        argv = sys.argv
+    pname = os.path.basename(argv[0])
+
+    try:
+        cOpts, cArgs = getopt.gnu_getopt(argv[1:], "a:c:d:hi:m:s:t:u:",
+                ["moon=", "crescent=", "date=", "help", "illum=", "minDark=",
+                    "site=", "step=", "sun="])
+    except getopt.GetoptError as msg:
+        print("%s: %s" % (pname, msg), file = sys.stderr)
+        usage()
+        return 1
+
+    d = dark.dark()
+    step = 60.
+    dates = []
+    values = {"sun": [18.], "moon": [0.], "illum": [0.], "crescent": [0.]}
+    for (opt, arg) in cOpts:
+        try:
+            if (opt in ("-d", "--date")):
+                dates.append(datetime.datetime.strptime(arg, "%Y-%m-%d"))
+            elif (opt in ("-h", "--help")):
+                usage()
+                return 0
+            elif (opt in ("-m", "--minDark")):
+                d.minDarkTime = float(arg)
+            elif (opt in ("-s", "--site")):
+                if (arg not in d.site):
+                    raise ValueError("invalid site")
+                d.optSite = arg
+            elif (opt in ("-t", "--step")):
+                step = float(arg)
+            else:
+                name = {"-a": "moon", "-c": "crescent", "-i": "illum",
+                        "-u": "sun"}.get(opt, opt[2:])
+                values[name] = [float(v) for v in arg.split(",")]
+        except ValueError:
+            print("%s: Invalid value for %s (%s)" % (pname, opt, arg),
+                    file = sys.stderr)
+            return 1
+
+    if (len(dates) == 0):
+        dates.append(datetime.datetime.combine(datetime.date.today(),
+            datetime.time()))
+    if (len(dates) == 1):
+        dates.append(dates[0] + datetime.timedelta(days = 365))
+    n = max(1, (dates[1] - dates[0]).days)
+
+    try:
+        table = nightTable(d, d.optSite, dates[0], n, step)
+    except ValueError as msg:
+        print("%s: %s" % (pname, msg), file = sys.stderr)
+        return 1
+
+    print("%s: %d nights from %s" % (d.site[d.optSite].name, n,
+        dates[0].date()))
+    print("%6s %6s %6s %8s  %6s %6s %9s" % ("sun", "moon", "illum",
+        "crescent", "dark", "runs", "hours"))
+    for sun, moon, illum, crescent in itertools.product(values["sun"],
+            values["moon"], values["illum"], values["crescent"]):
+        c = darkCriteria(sun, moon, illum, crescent)
+        nDark, nRun, hours = summary(c, table, d.minDarkTime)
+        print("%6.1f %6.1f %6.2f %8.1f  %6d %6d %9.1f" % (sun, moon, illum,
+            crescent, nDark, nRun, hours))
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
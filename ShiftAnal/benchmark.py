@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks the ShiftAnal statistics and checks them for regressions.
+
+Each case (the CVM test with cvm_2samp, shift scans with shifter, many
+against one tests with cvm_2samp_multi and mixture scans with mixer) is run
+on generated Xmax distributions of 10^k events, either continuous or
+rounded to whole g/cm^2 so that most values are tied. Wall time (the best
+of --repeat timings), peak memory and the number of memory blocks
+allocated during the call and still held after it (both from
+tracemalloc, which also sees numpy's allocations) are recorded for each
+case, along with the statistics it computed. tracemalloc cannot count
+every allocation made during the call, so the "held" column is not an
+allocation count: it shows memory that a case keeps (e.g. caches or
+leaks), and it is reported but not checked against the baseline.
+
+Every case is checked against an independent pure Python implementation
+of the statistic (for up to 10^--max-check events), and, if a baseline file
+is given, against the statistics and measurements in the baseline. The
+program exits with status 1 if a statistic disagrees by more than --rtol
+or a measurement grows by more than --threshold. Use --save to write the
+results of this run as the new baseline.
+
+Example:
+    ./benchmark.py --sizes 2 3 4 5 6 7 --baseline baseline.json --save
+    ./benchmark.py --sizes 2 3 4 5 6 7 --baseline baseline.json
+"""
+
+import argparse
+import bisect
+import json
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from cvm_2samp import cvm_2samp
+from cvm_multi import cvm_2samp_multi
+from mixer import mixer
+from shifter import shifter
+
+__author__  = "William Hanlon"
+__email__   = "whanlon@cosmic.utah.edu"
+__version__ = "1.0.0"
+
+def reference_stat(x, y):
+    """Return the CVM test statistic of x and y straight from its
+    definition, NM/(N + M)^2 times the sum of the squared ecdf differences
+    over every point of the pooled sample, using only the Python standard
+    library."""
+    x = sorted(float(v) for v in x)
+    y = sorted(float(v) for v in y)
+    N = float(len(x))
+    M = float(len(y))
+
+    s = 0.
+    for z in x + y:
+        d = bisect.bisect_right(x, z)/N - bisect.bisect_right(y, z)/M
+        s += d*d
+
+    return N*M/(N + M)**2*s
+
+def xmax(rng, n, mean, ties):
+    """Return n Xmax values (g/cm^2) drawn from a Gumbel distribution,
+    rounded to whole g/cm^2 if ties is True."""
+    x = rng.gumbel(mean, 50., n)
+    if ties:
+        x = np.round(x)
+    return x
+
+def case_eval(n, ties):
+    rng = np.random.default_rng(n)
+    x = xmax(rng, n, 750., ties)
+    y = xmax(rng, n, 752., ties)
+
+    def run():
+        return list(cvm_2samp(x, y).eval())
+
+    def check(result):
+        return [reference_stat(x, y)], result[:1]
+
+    return run, check
+
+def case_shift(n, ties):
+    rng = np.random.default_rng(n + 1)
+    x = xmax(rng, n, 750., ties)
+    y = xmax(rng, n, 740., ties)
+    steps = np.arange(-20., 21.)
+    binWidth = 1. if ties else None
+
+    def run():
+        T, limitT, p, bestShift = shifter(x, y, binWidth = binWidth).\
+                scan(steps)
+        return list(T) + [bestShift]
+
+    def check(result):
+        i = [0, len(steps)//2, len(steps) - 1]
+        return ([reference_stat(x, y + steps[j]) for j in i],
+                [result[j] for j in i])
+
+    return run, check
+
+def case_multi(n, ties):
+    rng = np.random.default_rng(n + 2)
+    x = xmax(rng, n, 750., ties)
+    ys = [xmax(rng, max(1, n//10), 700. + 10.*i, ties) for i in range(10)]
+
+    def run():
+        return list(cvm_2samp_multi(x).eval(ys, threads = 1)['T'])
+
+    def check(result):
+        return [reference_stat(x, y) for y in ys[:3]], result[:3]
+
+    return run, check
+
+def case_mixer(n, ties):
+    rng = np.random.default_rng(n + 3)
+    ys = [xmax(rng, n, mean, ties) for mean in (790., 760., 730., 700.)]
+    x = np.concatenate([y[:max(1, n//4)] for y in ys])
+
+    def run():
+        f, T, limitT, p, bestMix = mixer(x, ys).scan(10)
+        return list(T) + list(bestMix)
+
+    def check(result):
+        # a pure mixture is the species distribution itself
+        m = mixer(x, ys)
+        f = m.simplex(10)
+        i = [j for j in range(len(f)) if f[j].max() == 1.][:2]
+        return ([reference_stat(x, ys[int(np.argmax(f[j]))]) for j in i],
+                [result[j] for j in i])
+
+    return run, check
+
+# case name -> (function returning the run and check functions, largest
+# size exponent it is run at)
+CASES = {
+    'eval': (case_eval, 7),
+    'shift': (case_shift, 6),
+    'multi': (case_multi, 7),
+    'mixer': (case_mixer, 6),
+    }
+
+def measure(run, repeat):
+    """Return the result of run(), the best wall time (s) per call of repeat
+    timings, and the peak memory (bytes) and number of memory blocks
+    allocated and still held after one call traced by tracemalloc."""
+    # fast cases are timed over as many calls as take at least 0.2 s
+    timer = timeit.Timer(run)
+    number = timer.autorange()[0]
+    wall = min(timer.repeat(max(1, repeat), number))/number
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    result = run()
+    peak = tracemalloc.get_traced_memory()[1]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    held = sum(s.count_diff for s in after.compare_to(before, 'filename')
+            if s.count_diff > 0)
+
+    return result, wall, peak, held
+
+def agree(a, b, rtol):
+    """Return True if the lists of numbers a and b agree to rtol."""
+    return len(a) == len(b) and bool(np.allclose(a, b, rtol = rtol,
+        atol = 0.))
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark the ShiftAnal '
+            'statistics and check them for regressions.')
+    parser.add_argument('--sizes', type = int, nargs = '+',
+            default = [2, 3, 4, 5, 6], help = 'exponents k of the 10^k '
+            'event distributions to run (default: 2 to 6)')
+    parser.add_argument('--cases', nargs = '+', choices = sorted(CASES),
+            default = sorted(CASES), help = 'cases to run (default: all)')
+    parser.add_argument('--repeat', type = int, default = 3,
+            help = 'timings per case; the best is kept (default: 3)')
+    parser.add_argument('--baseline', help = 'JSON baseline to compare '
+            'with (and to write with --save)')
+    parser.add_argument('--save', action = 'store_true', default = False,
+            help = 'write the results of this run to the baseline')
+    parser.add_argument('--threshold', type = float, default = 0.25,
+            help = 'largest allowed relative increase of wall time and '
+            'peak memory over the baseline (default: 0.25)')
+    parser.add_argument('--rtol', type = float, default = 1.e-9,
+            help = 'relative tolerance on the statistics (default: 1e-9)')
+    parser.add_argument('--max-check', type = int, default = 5,
+            help = 'largest size exponent checked against the pure Python '
+            'reference (default: 5)')
+    args = parser.parse_args()
+    if args.save and args.baseline is None:
+        parser.error('--save needs --baseline')
+
+    baseline = {}
+    if args.baseline is not None and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    failed = []
+    print('%-24s %12s %12s %10s  %s' % ('case', 'wall (s)', 'peak (MB)',
+        'held', 'status'))
+    for name in args.cases:
+        case, maxSize = CASES[name]
+        for k in sorted(args.sizes):
+            if k > maxSize:
+                continue
+            for ties in (False, True):
+                key = '%s/%s/1e%d' % (name, 'ties' if ties else 'continuous',
+                        k)
+                run, check = case(10**k, ties)
+                result, wall, peak, held = measure(run, args.repeat)
+                result = [float(v) for v in result]
+                results[key] = {'wall': wall, 'peak': peak, 'held': held,
+                        'result': result}
+
+                problems = []
+                if k <= args.max_check:
+                    ref, got = check(result)
+                    if not agree(ref, got, args.rtol):
+                        problems.append('reference')
+
+                base = baseline.get(key)
+                if base is not None:
+                    if not agree(base['result'], result, args.rtol):
+                        problems.append('baseline')
+                    for m in ('wall', 'peak'):
+                        if results[key][m] > (1. + args.threshold)*base[m]:
+                            problems.append('%s +%.0f%%' % (m,
+                                100.*(results[key][m]/base[m] - 1.)))
+
+                if problems:
+                    failed.append(key)
+                print('%-24s %12.4g %12.4g %10d  %s' % (key, wall, peak/2.**20,
+                    held, ', '.join(problems) if problems else 'ok'))
+                sys.stdout.flush()
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent = 1, sort_keys = True)
+
+    if failed:
+        print('%d case(s) failed' % len(failed))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
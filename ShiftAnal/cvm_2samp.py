@@ -5,7 +5,14 @@ __author__  = "William Hanlon"
 __email__   = "whanlon@cosmic.utah.edu"
 __version__ = "1.0.0"
 
+import multiprocessing
+import os
+import tempfile
+import warnings
+from math import gcd
+
 import numpy as np
+from scipy.integrate import IntegrationWarning, quad
 from scipy.interpolate import interp1d
 
 class cvm_2samp:
@@ -40,28 +47,79 @@ class cvm_2samp:
     # create the interpolation function
     _interp_f = interp1d(_z, _a1_z, bounds_error = False)
 
-    def __init__(self, x, y):
-        self.x = np.sort(x)   # distribution 1  (vector-like)
-        self.y = np.sort(y)   # distribution 2  (vector-like)
+    # exact finite sample distributions are computed by dynamic programming
+    # and saved to cache_dir, keyed by sample sizes. set cache_dir to None to
+    # keep them in memory only.
+    cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'tasoft',
+            'cvm_2samp')
+    _exact_cache = {}
+
+    # method = 'auto' uses the exact distribution when N*M is at most this,
+    # and exact_table refuses to compute larger tables: their cost grows
+    # quickly with N*M (a 31x32 table takes about 10 s).
+    exact_max_nm = 1000
+
+    def __init__(self, x, y, wx = None, wy = None):
+        # distributions 1 and 2 (vector-like) and their optional per event
+        # weights (vector-like, same length as the distribution)
+        self.x, self.wx = self._sort(x, wx)
+        self.y, self.wy = self._sort(y, wy)
+
+        # effective sample sizes, (sum w)**2/sum w**2. these equal the
+        # number of events for unweighted distributions and are used in
+        # place of N and M to compute the significance of the test.
+        self.neff_x = self.effective_size(self.x, self.wx)
+        self.neff_y = self.effective_size(self.y, self.wy)
 
         # generate the ecdfs of the distributions
-        self.ecdf_x = self.gen_ecdf(self.x)
-        self.ecdf_y = self.gen_ecdf(self.y)
+        self.ecdf_x = self.gen_ecdf(self.x, self.wx)
+        self.ecdf_y = self.gen_ecdf(self.y, self.wy)
 
         # to plot the ecdf, one can do:
         # plt.step(x, ecdf_x)
 
 
-    def gen_ecdf(self, x):
-        fx = []
-        if len(x) == 0:
-            return np.array(fx)
-        n  = 0
-        for s in x:
-            n += 1
-            fx.append(n)
+    @staticmethod
+    def _sort(x, w):
+        """Return x sorted, along with the weights w in the same order."""
+        if w is None:
+            return np.sort(x), None
+
+        x = np.asarray(x, dtype = float)
+        w = np.asarray(w, dtype = float)
+        if x.shape != w.shape:
+            raise ValueError('cvm: distribution and weight lengths don\'t '
+                    'match')
+        if np.any(w < 0.) or (len(w) and w.sum() <= 0.):
+            raise ValueError('cvm: weights must be non-negative with a '
+                    'positive sum')
 
-        return np.array(fx)/float(n)
+        i = np.argsort(x, kind = 'mergesort')
+        return x[i], w[i]
+
+    @staticmethod
+    def effective_size(x, w = None):
+        """Return the effective sample size of the distribution x with
+        weights w, (sum w)**2/sum w**2, or len(x) if w is None."""
+        if w is None:
+            return float(len(x))
+        if len(w) == 0:
+            return 0.
+        return w.sum()**2/np.dot(w, w)
+
+    def gen_ecdf(self, x, w = None):
+        """Return the ECDF of the sorted distribution x evaluated at each of
+        its own points, i.e., the steps 1/n, 2/n, ..., 1, or the cumulative
+        fraction of the weight w if x is weighted."""
+        n = len(x)
+        if n == 0:
+            return np.array([])
+
+        if w is not None:
+            c = np.cumsum(w)
+            return c/c[-1]
+
+        return np.arange(1, n + 1)/float(n)
 
 
     def eval_ecdf(self, vx, ecdf, x):
@@ -71,36 +129,198 @@ class cvm_2samp:
             raise ValueError('eval_ecdf: distribution and ecdf lengths don\'t match') 
 
         i = np.searchsorted(vx, x, side = 'right') - 1
-        if i < 0:
-            return 0.
-        else:
-            return ecdf[i]
+        if np.ndim(i) == 0:
+            if i < 0:
+                return 0.
+            else:
+                return ecdf[i]
+
+        # array of points: i < 0 means x is below the first sample
+        return np.where(i < 0, 0., ecdf[np.maximum(i, 0)])
+
+    def ecdf_diff(self, t):
+        """Return ECDF_x(t) - ECDF_y(t) for every point in the array t.
 
-    def eval(self):
+        Uses a single searchsorted call per distribution. side = 'right'
+        counts the samples <= t, which is the same step definition used by
+        gen_ecdf and eval_ecdf, so tied values are handled identically."""
+        if self.wx is None and self.wy is None:
+            return (np.searchsorted(self.x, t, side = 'right')/
+                    float(len(self.x)) -
+                    np.searchsorted(self.y, t, side = 'right')/
+                    float(len(self.y)))
+
+        return (self.eval_ecdf(self.x, self.ecdf_x, t) -
+                self.eval_ecdf(self.y, self.ecdf_y, t))
+
+    def eval(self, method = 'asymptotic'):
         """The CVM test statistic and p-value are computed.
         
         Function returns the CVM test statistic, the test statistic adjusted to
-        the limiting value (where n, m -> infinity), and p-value."""
+        the limiting value (where n, m -> infinity), and p-value.
+
+        method selects how the p-value is computed: 'asymptotic' uses the
+        limiting distribution, 'exact' the finite sample distribution of
+        Anderson (1962) for samples of this size, and 'auto' the exact
+        distribution for small samples (see exact_max_nm) only.
+        'permutation' and 'bootstrap' estimate the p-value by resampling the
+        pooled sample with the defaults of resample_pvalue.
+
+        The exact distribution only holds for samples without ties, so
+        'exact' raises ValueError if the pooled sample has tied values, and
+        'auto' uses a permutation p-value (in this process) for small tied
+        samples instead.
+
+        For weighted distributions each point of the pooled sample counts in
+        proportion to its weight, and the effective sample sizes take the
+        place of N and M. Only the 'asymptotic' method (which 'auto' falls
+        back to) is available for weighted distributions."""
 
         T = 0.  # the test statistic
-        N = float(len(self.x))
-        M = float(len(self.y))
+        N = self.neff_x
+        M = self.neff_y
+
+        if len(self.x) == 0 or len(self.y) == 0:
+            raise ValueError('cvm: empty vector')
+
+        weighted = self.wx is not None or self.wy is not None
+        if weighted and method not in ('asymptotic', 'auto'):
+            raise ValueError('cvm: method %s is not available for weighted '
+                    'distributions' % method)
 
+        # the squared ecdf differences summed over every point of the pooled
+        # sample, which is the sum over the points of x plus the sum over the
+        # points of y. x and y are already sorted, so the searchsorted calls
+        # are cache friendly. tied points contribute once per occurrence, as
+        # in the definition of the statistic.
+        dx = self.ecdf_diff(self.x)
+        dy = self.ecdf_diff(self.y)
+
+        # the CVM test statistic. NM/(N + M) times the integral of the
+        # squared ecdf difference over the pooled ecdf. weighted points
+        # carry the pooled ecdf step N*w_i/(sum w)/(N + M) in place of
+        # 1/(N + M).
+        if weighted:
+            px = self.wx/self.wx.sum() if self.wx is not None else \
+                    np.full(len(self.x), 1./len(self.x))
+            py = self.wy/self.wy.sum() if self.wy is not None else \
+                    np.full(len(self.y), 1./len(self.y))
+            T = N*M/(N + M)**2*(N*np.dot(px, dx**2) + M*np.dot(py, dy**2))
+        else:
+            T = N*M/(N + M)**2*(np.dot(dx, dx) + np.dot(dy, dy))
+
+        if weighted:
+            method = 'asymptotic'
+
+        if method == 'exact' or (method == 'auto' and
+                N*M <= self.exact_max_nm):
+            if self.has_ties():
+                if method == 'exact':
+                    raise ValueError('cvm: the exact distribution does not '
+                            'hold for samples with ties')
+                limitT = self.significance(T, N, M)[0]
+                p = self.resample_pvalue('permutation', T = T,
+                        processes = 1)[0]
+                return T, limitT, p
+
+        if method in ('permutation', 'bootstrap'):
+            limitT = self.significance(T, N, M)[0]
+            p = self.resample_pvalue(method, T = T)[0]
+        else:
+            limitT, p = self.significance(T, N, M, method)
+
+        return T, limitT, p
+
+    def has_ties(self):
+        """Return True if any value occurs more than once in the pooled
+        sample of x and y."""
+        z = np.concatenate((self.x, self.y))
+        z.sort(kind = 'mergesort')
+        return bool(np.any(z[1:] == z[:-1]))
+
+    def resample_pvalue(self, method = 'permutation', nmax = 10000,
+            tol = 0.002, seed = None, processes = None, batch = None,
+            T = None):
+        """Estimate the p-value of the CVM test statistic by resampling the
+        pooled sample.
+
+        method = 'permutation' reassigns the x and y labels of the pooled
+        sample at random, 'bootstrap' draws both samples from the pooled
+        sample with replacement. Ties are treated exactly as in eval.
+
+        Resamples are evaluated in batches of batch resamples as 2-D arrays
+        (by default batches hold about 2**20 elements). Batches are spread
+        over a pool of processes worker processes (processes = None uses all
+        CPUs, 1 runs in this process). Each batch draws from its own random
+        stream spawned from seed, so results only depend on seed, not on the
+        number of processes. Resampling stops after nmax resamples or once
+        the half-width of the 95% confidence interval on the p-value is at
+        most tol.
+
+        Returns the p-value, the number of resamples used and the
+        (lower, upper) 95% confidence interval on the p-value."""
+        if method not in ('permutation', 'bootstrap'):
+            raise ValueError('cvm: unknown resampling method (%s)' % method)
+
+        N = len(self.x)
+        M = len(self.y)
         if N == 0 or M == 0:
             raise ValueError('cvm: empty vector')
 
-        s1 = 0.
-        for ex in self.x:
-            s1 += (self.eval_ecdf(self.x, self.ecdf_x, ex) -
-                    self.eval_ecdf(self.y, self.ecdf_y, ex))**2
-        
-        s2 = 0.
-        for ey in self.y:
-            s2 += (self.eval_ecdf(self.x, self.ecdf_x, ey) -
-                    self.eval_ecdf(self.y, self.ecdf_y, ey))**2
+        if T is None:
+            T = self.eval()[0]
+
+        if batch is None:
+            batch = max(1, 2**20//(N + M))
+        batch = min(batch, nmax)
+        sizes = [batch]*(nmax//batch)
+        if nmax % batch:
+            sizes.append(nmax % batch)
+
+        z = np.sort(np.concatenate((self.x, self.y)), kind = 'mergesort')
+        tasks = list(zip(np.random.SeedSequence(seed).spawn(len(sizes)),
+            sizes))
+        initargs = (z, N, M, T, method)
+
+        n = 0
+        k = 0
+        if processes == 1:
+            _resample_init(*initargs)
+            results = map(_resample_count, tasks)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(processes, _resample_init, initargs)
+            results = pool.imap(_resample_count, tasks)
+
+        try:
+            for c, size in zip(results, sizes):
+                k += c
+                n += size
+                lo, hi = _wilson_interval(k, n)
+                if (hi - lo)/2. <= tol:
+                    break
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        # including the observed sample keeps the estimate from being 0
+        p = (k + 1.)/(n + 1.)
 
-        # the CVM test statistic
-        T = N*M/(N + M)**2*(s1 + s2)
+        return p, n, (lo, hi)
+
+    @classmethod
+    def significance(cls, T, N, M, method = 'asymptotic'):
+        """Given the CVM test statistic T (a number or an array of them) of
+        samples of sizes N and M (numbers, or arrays that broadcast with T),
+        return the test statistic adjusted to the limiting value and the
+        p-value. See eval for the choice of method; the exact distribution
+        is looked up once for each distinct pair of N and M, which are
+        taken as integers and assumed to be samples without ties."""
+        if method not in ('asymptotic', 'exact', 'auto'):
+            raise ValueError('cvm: unknown method (%s)' % method)
+
+        T, N, M = np.broadcast_arrays(np.asarray(T, dtype = float),
+                np.asarray(N, dtype = float), np.asarray(M, dtype = float))
 
         # the expected value of T (under the null hypothesis)
         expT = 1./6. + 1./(6.*(M + N))
@@ -113,11 +333,245 @@ class cvm_2samp:
         # distribution
         limitT = (T - expT)/np.sqrt(45.*varT) + 1./6.
 
-
-        # p-value for this test statistic
-        if limitT > self._z[-1]:
-            p = 0.
+        if method == 'exact':
+            exact = np.ones(T.shape, dtype = bool)
+        elif method == 'auto':
+            exact = N*M <= cls.exact_max_nm
         else:
-            p = 1. - self._interp_f(limitT)
+            exact = np.zeros(T.shape, dtype = bool)
 
-        return T, limitT, p
+        # p-value for this test statistic. past the end of the table the
+        # limiting distribution is evaluated directly.
+        tail = ~exact & (limitT > cls._z[-1])
+        p = np.where(tail, 0., 1. - cls._interp_f(limitT))
+        for z in np.unique(limitT[tail]):
+            p[tail & (limitT == z)] = cls.limit_sf(z)
+
+        for n, m in set(zip(N[exact], M[exact])):
+            k = exact & (N == n) & (M == m)
+            p[k] = cls.exact_sf(T[k], int(n), int(m))
+
+        return limitT[()], p[()]
+
+    @staticmethod
+    def limit_sf(z):
+        """Return lim_{n->infinity} P(n omega^2 > z).
+
+        Uses Smirnov's series for the tail of the limiting distribution,
+        (1/pi) sum_k (-1)^(k+1) int_{(2k-1)pi}^{2k pi} sqrt(-t/sin(t))
+        exp(-t^2 z/2) 2/t dt, which converges quickly for large z and does
+        not lose precision to cancellation the way 1 - P(n omega^2 <= z)
+        does."""
+        if z <= 0.:
+            return 1.
+        # the tail is of order exp(-pi**2 z/2), which underflows past this
+        if np.pi**2*z/2. > 745.:
+            return 0.
+
+        # the factor exp(-pi**2 z/2) is taken out of the integrands so that
+        # they do not underflow for large z
+        # sin(t) < 0 inside each interval; its magnitude is taken so that
+        # rounding near the ends of the interval cannot make it positive
+        def f(t):
+            return np.sqrt(t/np.abs(np.sin(t)))*np.exp(-(t*t - np.pi**2)*z/2.)*2./t
+
+        # for large z the integrand is sharply peaked at the start of each
+        # interval, and quad may warn that it cannot reach epsrel there
+        # although its estimate is still far more precise than needed
+        sf = 0.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', IntegrationWarning)
+            for k in range(1, 1000):
+                # terms past the first only need to be resolved relative to
+                # the sum so far
+                v = quad(f, (2*k - 1)*np.pi, 2*k*np.pi, limit = 200,
+                        epsabs = 1.e-16*abs(sf), epsrel = 1.e-10)[0]
+                sf += (-1)**(k + 1)*v
+                if abs(v) <= 1.e-16*abs(sf):
+                    break
+
+        return sf*np.exp(-np.pi**2*z/2.)/np.pi
+
+    @classmethod
+    def exact_sf(cls, T, N, M):
+        """Return P(T' >= T) where T' has the exact distribution of the CVM
+        test statistic for samples of sizes N and M without ties."""
+        values, sf = cls.exact_table(N, M)
+
+        # T*N*M*(N + M)**2/g**2 is an integer for untied samples (see
+        # exact_table). allow for rounding in T.
+        g = gcd(N, M)
+        S = np.asarray(T, dtype = float)*N*M*(N + M)**2/g**2
+        i = np.searchsorted(values, np.ceil(S - 1.e-6*np.maximum(S, 1.)))
+
+        return np.append(sf, 0.)[i]
+
+    @classmethod
+    def exact_table(cls, N, M):
+        """Return the exact null distribution of the CVM test statistic for
+        samples of sizes N and M as the arrays (values, sf), where sf[k] is
+        the probability that the statistic is at least values[k].
+
+        With g = gcd(N, M), values are the integers
+        S = T*N*M*(N + M)**2/g**2 = sum_k (i_k*M/g - j_k*N/g)**2, where i_k
+        and j_k count the x and y values among the first k of the pooled,
+        sorted sample. All orderings of the pooled sample are equally likely
+        under the null hypothesis, so the distribution of S follows from
+        dynamic programming over the lattice path (i, j), carrying the
+        distribution of the partial sum at each point.
+
+        Tables are cached in memory and, if cache_dir is set, on disk.
+        Computing a table with N*M larger than exact_max_nm raises
+        ValueError."""
+        N = int(N)
+        M = int(M)
+        if N <= 0 or M <= 0:
+            raise ValueError('cvm: empty vector')
+        # the distribution is symmetric in N and M
+        if N > M:
+            N, M = M, N
+
+        key = (N, M)
+        if key in cls._exact_cache:
+            return cls._exact_cache[key]
+
+        fileName = None
+        if cls.cache_dir is not None:
+            fileName = os.path.join(cls.cache_dir, 'exact_%d_%d.npz' % key)
+            try:
+                with np.load(fileName) as f:
+                    table = (f['values'], f['sf'])
+            except (IOError, KeyError, ValueError):
+                pass
+            else:
+                cls._exact_cache[key] = table
+                return table
+
+        if N*M > cls.exact_max_nm:
+            raise ValueError('cvm: exact distribution of samples of sizes %d '
+                    'and %d is too costly (N*M > exact_max_nm = %d)' %
+                    (N, M, cls.exact_max_nm))
+
+        g = gcd(N, M)
+        n = N//g
+        m = M//g
+
+        # row[j] holds the (values, probabilities) of the partial sum at the
+        # lattice point (i, j) for the current i. prev is the row for i - 1.
+        prev = None
+        for i in range(N + 1):
+            row = []
+            for j in range(M + 1):
+                if i == 0 and j == 0:
+                    row.append((np.zeros(1, dtype = np.int64), np.ones(1)))
+                    continue
+
+                # probability of stepping into (i, j) from each neighbor.
+                # from (i', j') the next value is an x with probability
+                # (N - i')/(N + M - i' - j').
+                v = []
+                pr = []
+                if i > 0:
+                    v.append(prev[j][0])
+                    pr.append(prev[j][1]*(N - i + 1)/float(N + M - i - j + 1))
+                if j > 0:
+                    v.append(row[j - 1][0])
+                    pr.append(row[j - 1][1]*(M - j + 1)/
+                            float(N + M - i - j + 1))
+                v, inv = np.unique(np.concatenate(v), return_inverse = True)
+                pr = np.bincount(inv.ravel(), np.concatenate(pr))
+
+                row.append((v + (i*m - j*n)**2, pr))
+            prev = row
+
+        values, pr = prev[M]
+        sf = np.cumsum(pr[::-1])[::-1]
+        table = (values, np.minimum(sf, 1.))
+
+        if fileName is not None:
+            # write to a temporary file first so that concurrent callers
+            # never see a partial table
+            try:
+                if not os.path.isdir(cls.cache_dir):
+                    os.makedirs(cls.cache_dir)
+                fd, tmpName = tempfile.mkstemp(dir = cls.cache_dir,
+                        suffix = '.npz')
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, values = table[0], sf = table[1])
+                os.replace(tmpName, fileName)
+            except OSError:
+                pass
+
+        cls._exact_cache[key] = table
+        return table
+
+
+def _wilson_interval(k, n, zs = 1.96):
+    """Return the Wilson score interval for k successes in n trials."""
+    p = k/float(n)
+    c = (p + zs**2/(2.*n))/(1. + zs**2/n)
+    h = zs*np.sqrt(p*(1. - p)/n + zs**2/(4.*n**2))/(1. + zs**2/n)
+    return max(0., c - h), min(1., c + h)
+
+# state of a resampling worker, set by _resample_init
+_resample = {}
+
+def _resample_init(z, N, M, T, method):
+    """Set up a resampling worker. z is the sorted pooled sample of the N x
+    and M y values, and T the observed test statistic."""
+    _resample['z'] = z
+    _resample['N'] = N
+    _resample['M'] = M
+    _resample['T'] = T
+    _resample['method'] = method
+
+    # index of the last point tied with each point of z
+    _resample['end'] = np.searchsorted(z, z, side = 'right') - 1
+
+    # x labels of the pooled sample
+    labels = np.zeros(N + M, dtype = bool)
+    labels[:N] = True
+    _resample['labels'] = labels
+
+def _resample_count(task):
+    """Draw one batch of resamples for task = (seed, size) and return the
+    number with a test statistic at least as large as the observed one."""
+    seed, batch = task
+    T = _resample_stat(np.random.default_rng(seed), batch)
+
+    # allow for rounding in T of resamples identical to the observed one
+    return int(np.count_nonzero(T >= _resample['T']*(1. - 1.e-12)))
+
+def _resample_stat(rng, batch):
+    """Return the test statistic of batch resamples drawn with rng."""
+    z = _resample['z']
+    N = _resample['N']
+    M = _resample['M']
+
+    labels = np.broadcast_to(_resample['labels'], (batch, N + M))
+    if _resample['method'] == 'permutation':
+        # the pooled sample is fixed, only the labels are shuffled
+        lab = rng.permuted(labels, axis = 1)
+        end = _resample['end']
+        cx = np.cumsum(lab, axis = 1)[:, end]
+        cy = end + 1 - cx
+    else:
+        # draw N + M points of z with replacement, the first N are x. as z is
+        # sorted, sorting the drawn indices sorts each resample.
+        i = rng.integers(0, N + M, size = (batch, N + M))
+        order = np.argsort(i, axis = 1, kind = 'stable')
+        i = np.take_along_axis(i, order, axis = 1)
+        lab = np.take_along_axis(labels, order, axis = 1)
+
+        # index of the last point tied with each point of the resample
+        v = z[i]
+        last = np.ones(v.shape, dtype = bool)
+        last[:, :-1] = v[:, 1:] != v[:, :-1]
+        end = np.where(last, np.arange(N + M), N + M - 1)
+        end = np.minimum.accumulate(end[:, ::-1], axis = 1)[:, ::-1]
+
+        cx = np.take_along_axis(np.cumsum(lab, axis = 1), end, axis = 1)
+        cy = end + 1 - cx
+
+    d = cx/float(N) - cy/float(M)
+    return float(N)*M/(N + M)**2*np.einsum('ij,ij->i', d, d)
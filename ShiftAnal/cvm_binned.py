@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__  = "William Hanlon"
+__email__   = "whanlon@cosmic.utah.edu"
+__version__ = "1.0.0"
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from cvm_2samp import cvm_2samp
+
+class cvm_2samp_binned:
+    """Performs the two sample Cramér-von Mises test on two histogrammed
+    distributions.
+
+    hx and hy are the counts of distributions x and y in the same bins
+    (vector-like, same length). edges (optional) are the nbins + 1 shared bin
+    edges. All events in a bin are treated as tied, so the test statistic is
+    computed in O(nbins) operations regardless of the number of events. If
+    the events were binned from unbinned distributions, error() returns an
+    upper bound on the difference from the statistic of the unbinned
+    distributions.
+
+    shift() and scan() shift the y histogram by a whole number of bins with
+    the same interface as shifter. A shift moves the histogram along the
+    array, so no event is rebinned."""
+
+    def __init__(self, hx, hy, edges = None, chunkSize = 2**22):
+        self.hx = np.asarray(hx, dtype = float)
+        self.hy = np.asarray(hy, dtype = float)
+        if self.hx.ndim != 1 or self.hx.shape != self.hy.shape:
+            raise ValueError('cvm: histograms must be 1-D and the same length')
+        if np.any(self.hx < 0.) or np.any(self.hy < 0.):
+            raise ValueError('cvm: histogram counts must be non-negative')
+
+        self.nbins = len(self.hx)
+        self.edges = None
+        if edges is not None:
+            self.edges = np.asarray(edges, dtype = float)
+            if self.edges.shape != (self.nbins + 1,):
+                raise ValueError('cvm: need one more bin edge than bins')
+
+        self.N = self.hx.sum()
+        self.M = self.hy.sum()
+
+        # maximum number of array elements evaluated at once during a scan
+        self.chunkSize = chunkSize
+
+    @classmethod
+    def from_samples(cls, x, y, binWidth, **kwargs):
+        """Histogram the distributions x and y on common bins of width
+        binWidth. Bin edges are multiples of binWidth, so distributions
+        rounded to multiples of binWidth keep their exact values."""
+        x = np.asarray(x, dtype = float)
+        y = np.asarray(y, dtype = float)
+        if len(x) == 0 or len(y) == 0:
+            raise ValueError('cvm: empty vector')
+
+        # bins are closed on the left
+        ix = np.floor(x/binWidth).astype(np.int64)
+        iy = np.floor(y/binWidth).astype(np.int64)
+        lo = min(ix.min(), iy.min())
+        hi = max(ix.max(), iy.max())
+
+        nbins = int(hi - lo + 1)
+        hx = np.bincount(ix - lo, minlength = nbins)
+        hy = np.bincount(iy - lo, minlength = nbins)
+        edges = np.arange(lo, hi + 2)*float(binWidth)
+
+        return cls(hx, hy, edges, **kwargs)
+
+    def _stat(self):
+        """Return the CVM test statistic of the binned distributions and an
+        upper bound on its binning error."""
+        if self.N == 0 or self.M == 0:
+            raise ValueError('cvm: empty vector')
+
+        N = float(self.N)
+        M = float(self.M)
+
+        # ecdf difference at the end of each bin, where it is evaluated for
+        # every event in the bin
+        d = np.cumsum(self.hx)/N - np.cumsum(self.hy)/M
+        n = self.hx + self.hy
+        T = N*M/(N + M)**2*np.dot(n, d**2)
+
+        # for an event inside a bin, each ecdf lies between its values at the
+        # two ends of the bin, so the ecdf difference is within
+        # e = max(hx/N, hy/M) of d, and its square within e*(2|d| + e) of d**2
+        e = np.maximum(self.hx/N, self.hy/M)
+        err = N*M/(N + M)**2*np.dot(n, e*(2.*np.abs(d) + e))
+
+        return T, err
+
+    def eval(self):
+        """The CVM test statistic and p-value are computed.
+
+        Function returns the CVM test statistic, the test statistic adjusted to
+        the limiting value (where n, m -> infinity), and p-value."""
+        T = self._stat()[0]
+        limitT, p = cvm_2samp.significance(T, self.N, self.M)
+
+        return T, limitT, p
+
+    def error(self):
+        """Return an upper bound on the absolute difference between the test
+        statistic returned by eval and that of the unbinned distributions."""
+        return self._stat()[1]
+
+    def _bins(self, steps):
+        """Convert shifts in the units of edges (in bins if there are no
+        edges) to whole numbers of bins."""
+        steps = np.asarray(steps, dtype = float)
+        if self.edges is None:
+            k = steps
+        else:
+            width = np.diff(self.edges)
+            if not np.allclose(width, width[0]):
+                raise ValueError('cvm: shifts need bins of equal width')
+            k = steps/width[0]
+
+        kr = np.round(k)
+        if not np.allclose(k, kr, rtol = 0., atol = 1.e-6):
+            raise ValueError('cvm: shifts must be whole numbers of bins')
+
+        return kr.astype(np.int64)
+
+    def _shift_stat(self, k):
+        """Return the CVM test statistic with the y histogram shifted by each
+        number of bins in the 1-D array k, and an upper bound on its binning
+        error (see _stat)."""
+        N = float(self.N)
+        M = float(self.M)
+        P = int(np.max(np.abs(k)))
+        L = self.nbins + 2*P
+
+        # pad x with P empty bins on each side so that no shifted event falls
+        # off the end. y gets 2P empty bins so that each shift is a window of
+        # length L starting at bin P - k. the cumulative sum of the padding
+        # before a window is 0, so windows of the cumulative sum of y are the
+        # ecdfs of the shifted histograms.
+        hx = np.pad(self.hx, P)
+        cx = np.cumsum(hx)/N
+        hy = np.pad(self.hy, 2*P)
+        cy = np.cumsum(hy)/M
+
+        start = P - k
+        hyk = sliding_window_view(hy, L)[start]
+        d = cx - sliding_window_view(cy, L)[start]
+
+        n = hx + hyk
+        e = np.maximum(hx/N, hyk/M)
+        T = N*M/(N + M)**2*np.einsum('ij,ij->i', n, d*d)
+        err = N*M/(N + M)**2*np.einsum('ij,ij->i', n, e*(2.*np.abs(d) + e))
+
+        return T, err
+
+    def _shift_all(self, step):
+        """Return the CVM test statistic and its binning error bound for
+        each shift in STEP, as arrays of the shape of STEP."""
+        k = self._bins(step)
+        flat = k.ravel()
+
+        T = np.empty(len(flat))
+        err = np.empty(len(flat))
+        if len(flat):
+            n = max(1, self.chunkSize//(self.nbins + 2*int(np.abs(flat).max())))
+            for i in range(0, len(flat), n):
+                T[i:i + n], err[i:i + n] = self._shift_stat(flat[i:i + n])
+
+        return T.reshape(k.shape), err.reshape(k.shape)
+
+    def shift(self, step = 0.):
+        """Shift the y histogram by STEP (in the units of the bin edges, or in
+        bins if there are no edges) and return the CVM test statistic, the
+        test statistic adjusted to the limiting value, and the p-value.
+
+        STEP may be a single shift or an array of shifts, in which case
+        arrays of the same shape are returned. Shifts must be whole numbers
+        of bins."""
+        T = self._shift_all(step)[0]
+        limitT, p = cvm_2samp.significance(T, self.N, self.M)
+
+        return T[()], limitT, p
+
+    def shift_error(self, step = 0.):
+        """Return an upper bound on the absolute difference between the test
+        statistic returned by shift(STEP) and that of the unbinned
+        distributions, with the same shape as STEP."""
+        return self._shift_all(step)[1][()]
+
+    def scan(self, steps):
+        """Shift the y histogram by each value in STEPS.
+
+        Returns arrays of the CVM test statistic, the test statistic adjusted
+        to the limiting value, and the p-value for every shift, along with
+        the shift that minimizes the test statistic."""
+        steps = np.atleast_1d(np.asarray(steps, dtype = float))
+        if steps.ndim != 1 or len(steps) == 0:
+            raise ValueError('cvm: steps must be a non-empty 1-D array')
+
+        T, limitT, p = self.shift(steps)
+        bestShift = steps[np.argmin(T)]
+
+        return T, limitT, p, bestShift
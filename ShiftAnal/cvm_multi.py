@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__  = "William Hanlon"
+__email__   = "whanlon@cosmic.utah.edu"
+__version__ = "1.0.0"
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cvm_2samp import cvm_2samp
+
+class cvm_2samp_multi:
+    """Performs two sample Cramér-von Mises tests of one reference
+    distribution against many candidate distributions, e.g., one data Xmax
+    distribution against a library of MC distributions.
+
+    The reference is sorted and indexed once: its ecdf at its own points and
+    prefix sums of that ecdf and its square are kept. Each candidate then
+    only needs to be sorted and searched for in the reference, so a
+    comparison costs O(M log M + M log N) for a candidate of M events against
+    a reference of N events. The contribution of the reference points comes
+    from the prefix sums."""
+
+    def __init__(self, reference):
+        self.x = np.sort(np.asarray(reference, dtype = float))
+        self.N = len(self.x)
+        if self.N == 0:
+            raise ValueError('cvm: empty vector')
+
+        # index one past the last point of the reference equal to each point
+        # of the reference
+        self._end = np.searchsorted(self.x, self.x, side = 'right')
+        ecdf_xx = self._end/float(self.N)
+
+        # prefix sums of the ecdf of the reference and its square at the
+        # points of the reference
+        self._p1 = np.concatenate(([0.], np.cumsum(ecdf_xx)))
+        self._p2 = np.concatenate(([0.], np.cumsum(ecdf_xx**2)))
+
+    def offset_stat(self, a, ecdf_aa, offsets = 0.):
+        """Return the CVM test statistic of the sorted distribution a against
+        the reference shifted by each value in offsets (a number or a 1-D
+        array), as an array with one value per offset.
+
+        ecdf_aa is the ecdf of a evaluated at its own points,
+        np.searchsorted(a, a, side = 'right')/len(a), which callers testing
+        the same distribution at many offsets (as shifter does) compute
+        once. Each offset costs one search of the points of a in the
+        reference, and the statistic is exact, ties included."""
+        offsets = np.atleast_1d(np.asarray(offsets, dtype = float))
+        x = self.x
+        na = float(len(a))
+        nx = float(self.N)
+
+        # points of a relative to the unshifted reference. the reference
+        # shifted by o evaluated at a_i is the unshifted reference evaluated
+        # at a_i - o.
+        q = a[np.newaxis, :] - offsets[:, np.newaxis]
+
+        # number of points of the reference below (L) and at or below (R)
+        # each query point. only one search is needed; R differs from L only
+        # where the query point ties with a point of the reference.
+        L = np.searchsorted(x, q, side = 'left')
+        i = np.minimum(L, self.N - 1)
+        R = np.where(x[i] == q, self._end[i], L)
+
+        # ecdf differences at the points of a
+        d = ecdf_aa - R/nx
+        s1 = np.einsum('ij,ij->i', d, d)
+
+        # at the points of the reference the ecdf of a is a step function.
+        # the points x_j with L[g - 1] <= j < L[g] all see g points of a at or
+        # below them (with L[-1] = 0 and L[na] = N), so their contribution is
+        # the sum of (g/na - ecdf_xx[j])**2 over that range. summing by parts
+        # over g, the sum over every point of the reference is
+        # N - sum_g L[g]*(2g + 1)/na**2 - 2*p1[N] + (2/na)*sum_g p1[L[g]]
+        # + p2[N], for g = 0, ..., na - 1, so only p1 is looked up.
+        w = (2.*np.arange(len(a)) + 1.)/na**2
+        s2 = (nx - L.dot(w) - 2.*self._p1[-1] +
+                2./na*self._p1[L].sum(axis = 1) + self._p2[-1])
+
+        return na*nx/(na + nx)**2*(s1 + s2)
+
+    def stat(self, y):
+        """Return the CVM test statistic of the reference against the
+        distribution y."""
+        a = np.sort(np.asarray(y, dtype = float))
+        if len(a) == 0:
+            raise ValueError('cvm: empty vector')
+        ecdf_aa = np.searchsorted(a, a, side = 'right')/float(len(a))
+
+        return self.offset_stat(a, ecdf_aa)[0]
+
+    def eval(self, candidates, method = 'asymptotic', threads = None):
+        """Test the reference against each candidate distribution.
+
+        candidates is a list of distributions, a 2-D array with one
+        distribution per row, or a dictionary of distributions keyed by
+        name. Candidates are evaluated in a pool of threads threads
+        (threads = None uses the ThreadPoolExecutor default, 1 evaluates
+        them in turn); the sorts and searches release the GIL. See
+        cvm_2samp.eval for the choice of method.
+
+        Returns a structured array with one row per candidate and the fields
+        name (the dictionary key or the candidate index), M (the number of
+        events in the candidate), T (the CVM test statistic), limitT (the
+        test statistic adjusted to the limiting value) and p (the p-value)."""
+        if isinstance(candidates, dict):
+            names = [str(k) for k in candidates.keys()]
+            samples = list(candidates.values())
+        else:
+            samples = list(candidates)
+            names = [str(i) for i in range(len(samples))]
+
+        if threads == 1:
+            T = list(map(self.stat, samples))
+        else:
+            with ThreadPoolExecutor(threads) as pool:
+                T = list(pool.map(self.stat, samples))
+
+        width = max([len(s) for s in names] + [1])
+        table = np.zeros(len(samples), dtype = [('name', 'U%d' % width),
+            ('M', np.int64), ('T', float), ('limitT', float), ('p', float)])
+        table['name'] = names
+        table['M'] = [len(s) for s in samples]
+        table['T'] = T
+        for row in table:
+            row['limitT'], row['p'] = cvm_2samp.significance(row['T'],
+                    self.N, row['M'], method)
+
+        return table
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__  = "William Hanlon"
+__email__   = "whanlon@cosmic.utah.edu"
+__version__ = "1.0.0"
+
+import numpy as np
+
+from cvm_binned import cvm_2samp_binned
+
+class cvm_2samp_stream(cvm_2samp_binned):
+    """Performs the two sample Cramér-von Mises test on two distributions that
+    are too large to hold in memory.
+
+    x and y may each be an array (including an np.memmap), the path of a .npy
+    file, the path of a raw binary file of dtype values, or an iterable of
+    array chunks. The distributions are read chunkSize values at a time and
+    histogrammed on nbins bins of equal width, so memory use is bounded by
+    nbins and chunkSize, independent of the size of the distributions.
+
+    The test statistic is computed from the binned ecdfs by
+    cvm_2samp_binned, i.e., as if all events in a bin shared one value.
+    error() returns an upper bound on the difference from the statistic of
+    the unbinned distributions.
+
+    The bin range is taken from range = (lo, hi) if given, otherwise from a
+    first pass over both distributions. Iterables can only be read once, so
+    range must be given if either distribution is an iterable. Values
+    outside of range are counted in the first or last bin, which keeps
+    their order with respect to the other values. NaNs are ignored."""
+
+    def __init__(self, x, y, nbins = 2**20, range = None, chunkSize = 2**22,
+            dtype = np.float64):
+        self.nbins = int(nbins)
+        self.chunkSize = int(chunkSize)
+        self.dtype = dtype
+        if self.nbins < 1:
+            raise ValueError('cvm: nbins must be positive')
+
+        x = self._open(x)
+        y = self._open(y)
+
+        if range is None:
+            if not (isinstance(x, np.ndarray) and isinstance(y, np.ndarray)):
+                raise ValueError('cvm: range is required to read iterables')
+            lo = np.inf
+            hi = -np.inf
+            for src in (x, y):
+                for c in self._chunks(src):
+                    if len(c):
+                        lo = min(lo, np.min(c))
+                        hi = max(hi, np.max(c))
+            if lo > hi:
+                raise ValueError('cvm: empty vector')
+            range = (lo, hi)
+
+        lo, hi = float(range[0]), float(range[1])
+        if not lo <= hi:
+            raise ValueError('cvm: invalid range (%s, %s)' % (lo, hi))
+        if lo == hi:
+            # all values equal. any bin width will do
+            hi = lo + 1.
+        self.edges = np.linspace(lo, hi, self.nbins + 1)
+
+        # histograms of the distributions
+        hx = self._histogram(x)
+        hy = self._histogram(y)
+
+        cvm_2samp_binned.__init__(self, hx, hy, self.edges, self.chunkSize)
+
+    def _open(self, src):
+        """Return the distribution src as an array (memory mapped for files)
+        or as an iterator over chunks."""
+        if isinstance(src, str):
+            if src.endswith('.npy'):
+                return np.load(src, mmap_mode = 'r')
+            return np.memmap(src, dtype = self.dtype, mode = 'r')
+        if isinstance(src, np.ndarray):
+            return src
+        return iter(src)
+
+    def _chunks(self, src):
+        """Yield the values of the distribution src in 1-D chunks without
+        NaNs."""
+        if isinstance(src, np.ndarray):
+            src = src.reshape(-1)
+            chunks = (src[i:i + self.chunkSize]
+                    for i in range(0, len(src), self.chunkSize))
+        else:
+            chunks = src
+
+        for c in chunks:
+            c = np.asarray(c, dtype = np.float64).reshape(-1)
+            yield c[~np.isnan(c)]
+
+    def _histogram(self, src):
+        """Return the counts of the distribution src in each bin."""
+        lo = self.edges[0]
+        scale = self.nbins/(self.edges[-1] - lo)
+
+        h = np.zeros(self.nbins, dtype = np.int64)
+        for c in self._chunks(src):
+            # bins are closed on the left, the last bin is also closed on the
+            # right (as in np.histogram)
+            i = np.floor((c - lo)*scale)
+            i = np.clip(i, 0, self.nbins - 1).astype(np.intp)
+            h += np.bincount(i, minlength = self.nbins)
+
+        return h
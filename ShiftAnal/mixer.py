@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__  = "William Hanlon"
+__email__   = "whanlon@cosmic.utah.edu"
+__version__ = "1.0.0"
+
+from itertools import combinations
+
+import numpy as np
+from scipy.optimize import minimize
+
+from cvm_2samp import cvm_2samp
+
+class mixer:
+    """Fits the fractions of a mixture of MC primary species (e.g. proton,
+    helium, nitrogen and iron) to a data Xmax distribution using the two
+    sample Cramér-von Mises test.
+
+    A mixture with fractions f_k is the weighted distribution made of all
+    the species' events, where each event of species k, of M_k events, has
+    weight f_k/M_k. Its ecdf is sum_k f_k ecdf_k, and the test statistic is
+    that of cvm_2samp with these weights. The effective size of the mixture,
+    1/sum_k (f_k**2/M_k), takes the place of M in the significance.
+
+    Every distribution is sorted once when the object is created, and the
+    ecdf of the data and of each species are evaluated at the distinct
+    values of the pooled distribution. Evaluating a mixture is then a linear
+    combination of the species' ecdfs, with no sorting or searching, and
+    a set of mixtures is evaluated as a 2-D array operation (mixtures x
+    values), split into chunks so that no more than chunkSize elements are
+    held in memory at a time."""
+
+    def __init__(self, xmaxData, xmaxMC, chunkSize = 2**22):
+        # xmaxMC is a list of MC distributions, one per species, or a
+        # dictionary of them keyed by species name
+        if isinstance(xmaxMC, dict):
+            self.names = [str(k) for k in xmaxMC.keys()]
+            xmaxMC = list(xmaxMC.values())
+        else:
+            xmaxMC = list(xmaxMC)
+            self.names = [str(i) for i in range(len(xmaxMC))]
+
+        self.x = np.sort(np.asarray(xmaxData, dtype = float))      # data
+        self.y = [np.sort(np.asarray(y, dtype = float)) for y in xmaxMC]
+
+        self.N = len(self.x)
+        self.M = np.array([len(y) for y in self.y], dtype = float)
+        self.K = len(self.y)
+        if self.K < 2:
+            raise ValueError('mixer: at least two species are required')
+        if self.N == 0 or np.any(self.M == 0):
+            raise ValueError('mixer: empty vector')
+
+        # maximum number of array elements evaluated at once
+        self.chunkSize = chunkSize
+
+        # tied points share the same ecdf differences, so the sums over the
+        # pooled distribution run over its distinct values u only, each
+        # counted as many times as it occurs. side = 'right' gives tied
+        # values the same (largest) step, as in cvm_2samp.
+        u = np.unique(np.concatenate([self.x] + self.y))
+        self._ecdf_x = np.searchsorted(self.x, u, side = 'right')/\
+                float(self.N)
+        self._count_x = np.diff(np.searchsorted(self.x, u, side = 'right'),
+                prepend = 0).astype(float)
+
+        # ecdf of each species at u (K x len(u)), and the weight each value
+        # carries in a species, i.e., its number of occurrences over M_k
+        c = np.array([np.searchsorted(y, u, side = 'right') for y in self.y])
+        self._ecdf_y = c/self.M[:, np.newaxis]
+        self._weight_y = np.diff(c, axis = 1, prepend = 0)/\
+                self.M[:, np.newaxis]
+
+    def _check(self, fractions):
+        """Return fractions as a 2-D array (mixtures x species) normalized to
+        unit sum."""
+        f = np.atleast_2d(np.asarray(fractions, dtype = float))
+        if f.ndim != 2 or f.shape[1] != self.K:
+            raise ValueError('mixer: fractions must have %d columns' %
+                    self.K)
+        s = f.sum(axis = 1, keepdims = True)
+        if np.any(f < 0.) or np.any(s <= 0.):
+            raise ValueError('mixer: fractions must be non-negative with a '
+                    'positive sum')
+        return f/s
+
+    def effective_size(self, f):
+        """Return the effective size of the mixture for each row of the 2-D
+        array of normalized fractions f."""
+        return 1./np.dot(f**2, 1./self.M)
+
+    def _stat(self, f):
+        """Return the CVM test statistic and the effective size of the
+        mixture for each row of the 2-D array of normalized fractions f."""
+        N = float(self.N)
+        M = self.effective_size(f)
+
+        d = self._ecdf_x - np.dot(f, self._ecdf_y)
+        d2 = d**2
+        s1 = np.dot(d2, self._count_x)
+        s2 = M*np.einsum('ij,ij->i', np.dot(f, self._weight_y), d2)
+
+        return N*M/(N + M)**2*(s1 + s2), M
+
+    def _grad(self, f):
+        """Return the CVM test statistic of the mixture with normalized
+        fractions f (1-D) and its gradient with respect to f."""
+        N = float(self.N)
+        M = 1./np.dot(f**2, 1./self.M)
+
+        d = self._ecdf_x - np.dot(f, self._ecdf_y)
+        d2 = d**2
+        py = np.dot(f, self._weight_y)
+        A = np.dot(py, d2)
+        S = np.dot(d2, self._count_x) + M*A
+
+        # d is linear in f, as is the weight py of each value, so S is a
+        # polynomial in f apart from the effective size M
+        dM = -2.*M**2*f/self.M
+        dA = np.dot(self._weight_y, d2) - 2.*np.dot(self._ecdf_y, py*d)
+        dS = -2.*np.dot(self._ecdf_y, self._count_x*d) + dM*A + M*dA
+
+        c = N*M/(N + M)**2
+        dc = N*(N - M)/(N + M)**3*dM
+
+        return c*S, dc*S + c*dS
+
+    def mix(self, fractions):
+        """Return the CVM test statistic, the test statistic adjusted to the
+        limiting value, and the p-value of the data against the mixture with
+        the given fractions of each species. Fractions are normalized to
+        unit sum.
+
+        fractions may be a 1-D array of K fractions or a 2-D array with one
+        mixture per row, in which case arrays with one value per mixture are
+        returned."""
+        single = np.ndim(fractions) == 1
+        f = self._check(fractions)
+
+        T = np.empty(len(f))
+        M = np.empty(len(f))
+        n = max(1, self.chunkSize//(len(self._ecdf_x)*(self.K + 2)))
+        for i in range(0, len(f), n):
+            T[i:i + n], M[i:i + n] = self._stat(f[i:i + n])
+
+        # the significance is that of weighted distributions, so only the
+        # limiting distribution is available (see cvm_2samp.eval)
+        limitT, p = cvm_2samp.significance(T, self.N, M)
+
+        if single:
+            return T[0], limitT[0], p[0]
+        return T, limitT, p
+
+    def simplex(self, n):
+        """Return every mixture whose fractions are multiples of 1/n, as a
+        2-D array with one mixture per row."""
+        # stars and bars: the K - 1 bars are placed among n + K - 1 slots
+        bars = np.array(list(combinations(range(n + self.K - 1),
+            self.K - 1)), dtype = int).reshape(-1, self.K - 1)
+        edges = np.concatenate((np.full((len(bars), 1), -1), bars,
+            np.full((len(bars), 1), n + self.K - 1)), axis = 1)
+        return (np.diff(edges, axis = 1) - 1)/float(n)
+
+    def scan(self, n = 20):
+        """Evaluate every mixture whose fractions are multiples of 1/n.
+
+        Returns the mixtures (one per row), arrays of the CVM test statistic,
+        the test statistic adjusted to the limiting value, and the p-value
+        for each of them, along with the mixture that minimizes the test
+        statistic."""
+        if n < 1:
+            raise ValueError('mixer: n must be a positive integer')
+
+        f = self.simplex(int(n))
+        T, limitT, p = self.mix(f)
+        bestMix = f[np.argmin(T)]
+
+        return f, T, limitT, p, bestMix
+
+    def fit(self, start = None, n = 10):
+        """Find the mixture that minimizes the CVM test statistic.
+
+        The search starts from the fractions start or, if start is None,
+        from the best mixture of a scan with fractions in multiples of 1/n.
+        The statistic is minimized over the simplex of fractions using
+        sequential least squares programming with its analytic gradient.
+
+        Returns the fitted fractions, the CVM test statistic, the test
+        statistic adjusted to the limiting value, and the p-value."""
+        if start is None:
+            start = self.scan(n)[-1]
+        f0 = self._check(start)[0]
+
+        res = minimize(self._grad, f0, jac = True, method = 'SLSQP',
+                bounds = [(0., 1.)]*self.K,
+                constraints = {'type': 'eq',
+                    'fun': lambda f: f.sum() - 1.,
+                    'jac': lambda f: np.ones_like(f)})
+
+        f = np.clip(res.x, 0., 1.)
+        f /= f.sum()
+
+        # keep the starting point if the optimizer did not improve on it
+        if self._grad(f)[0] > self._grad(f0)[0]:
+            f = f0
+
+        T, limitT, p = self.mix(f)
+        return f, T, limitT, p
@@ -7,13 +7,123 @@ __version__ = "1.0.0"
 
 import numpy as np
 #import matplotlib.pyplot as plt
-from scipy.interpolate import interp1d
+
+from cvm_2samp import cvm_2samp
+from cvm_binned import cvm_2samp_binned
+from cvm_multi import cvm_2samp_multi
 
 class shifter:
-    def __init__(self, xmaxData, xmaxMC):
-        pass
+    """Scans Xmax offsets between a data and MC distribution using the two
+    sample Cramér-von Mises test.
+
+    Both distributions are sorted once when the object is created. Only the
+    points of the smaller distribution are searched for in the larger one for
+    each shift; the contribution of the larger distribution is taken from
+    prefix sums of its ecdf (see cvm_2samp_multi.offset_stat). A scan over a
+    grid of shifts is evaluated as a 2-D array operation (shifts x events),
+    split into chunks of shifts so that no more than chunkSize elements are
+    held in memory at a time.
+
+    If binWidth (g/cm^2) is given, both distributions are histogrammed on
+    common bins of that width instead, and shifts, which must then be
+    multiples of binWidth, move the MC histogram by whole bins (see
+    cvm_2samp_binned). Each shift then costs O(bins) rather than
+    O(events). The statistic is exact if the distributions are already
+    rounded to multiples of binWidth; otherwise error() bounds how far it
+    can be from the unbinned statistic.
+
+    Without binning every shift still searches for each point of the
+    smaller distribution in the larger one, so a scan costs about
+    shifts x (smaller sample) binary searches. For 200 shifts this is
+    about 2.1 s for 10^5 against 10^5 events (some 65 single evaluations
+    of cvm_2samp) and 0.8 s for 2x10^4 against 2x10^5 (some 30). With
+    binWidth = 0.2 g/cm^2 the same scans take 0.2 and 0.35 s, most of it
+    spent on the p-values of the shifts in the far tail."""
+
+    def __init__(self, xmaxData, xmaxMC, chunkSize = 2**22, binWidth = None):
+        self.x = np.sort(np.asarray(xmaxData, dtype = float))   # data
+        self.y = np.sort(np.asarray(xmaxMC, dtype = float))     # MC
+
+        self.N = len(self.x)
+        self.M = len(self.y)
+        if self.N == 0 or self.M == 0:
+            raise ValueError('shifter: empty vector')
+
+        # maximum number of array elements evaluated at once during a scan
+        self.chunkSize = chunkSize
+
+        self.binned = None
+        if binWidth is not None:
+            self.binned = cvm_2samp_binned.from_samples(self.x, self.y,
+                    binWidth, chunkSize = chunkSize)
+
+        # the test statistic is symmetric in the two distributions, and
+        # shifting the MC by s is the same as shifting the data by -s. a is
+        # the smaller of the two distributions and b, the larger one, is
+        # indexed as the reference of a cvm_2samp_multi, shifted by
+        # self._sign*step relative to a.
+        if self.N <= self.M:
+            self._a, b, self._sign = self.x, self.y, 1.
+        else:
+            self._a, b, self._sign = self.y, self.x, -1.
+        self._index = cvm_2samp_multi(b)
+
+        # the ecdf of a evaluated at its own points does not depend on the
+        # shift. side = 'right' gives tied values the same (largest) step, as
+        # in cvm_2samp.
+        self._ecdf_aa = np.searchsorted(self._a, self._a, side = 'right')/\
+                float(len(self._a))
+
+    def _stat(self, steps):
+        """Return the CVM test statistic for each shift in the 1-D array
+        steps, at the cost of one search of the smaller distribution in the
+        larger one per shift."""
+        return self._index.offset_stat(self._a, self._ecdf_aa,
+                self._sign*steps)
 
     def shift(self, step = 0.):
         """Shift the MC distribution by STEP g/cm^2 and return the CVM test
-        statistic."""
-        pass
+        statistic, the test statistic adjusted to the limiting value, and the
+        p-value.
+
+        STEP may be a single shift or an array of shifts, in which case
+        arrays of the same shape are returned."""
+        if self.binned is not None:
+            return self.binned.shift(step)
+
+        steps = np.asarray(step, dtype = float)
+        flat = steps.ravel()
+
+        T = np.empty(len(flat))
+        n = max(1, self.chunkSize//(min(self.N, self.M) + 1))
+        for i in range(0, len(flat), n):
+            T[i:i + n] = self._stat(flat[i:i + n])
+        T = T.reshape(steps.shape)
+
+        limitT, p = cvm_2samp.significance(T, self.N, self.M)
+
+        return T[()], limitT, p
+
+    def error(self, step = 0.):
+        """Return an upper bound on the absolute difference between the test
+        statistic returned by shift(STEP) and that of the unbinned
+        distributions (0 if the distributions aren't binned), with the same
+        shape as STEP."""
+        if self.binned is not None:
+            return self.binned.shift_error(step)
+        return np.zeros(np.shape(step))[()]
+
+    def scan(self, steps):
+        """Shift the MC distribution by each value in STEPS (g/cm^2).
+
+        Returns arrays of the CVM test statistic, the test statistic adjusted
+        to the limiting value, and the p-value for every shift, along with
+        the shift that minimizes the test statistic."""
+        steps = np.atleast_1d(np.asarray(steps, dtype = float))
+        if steps.ndim != 1 or len(steps) == 0:
+            raise ValueError('shifter: steps must be a non-empty 1-D array')
+
+        T, limitT, p = self.shift(steps)
+        bestShift = steps[np.argmin(T)]
+
+        return T, limitT, p, bestShift